@@ -0,0 +1,108 @@
+"""
+Benchmark ticket insertion latency against order quantity.
+
+Compares the original per-unit ORM loop used by reserve/book with the
+bulk insert_tickets path. Run from the app directory:
+
+    python -m benchmarks.bench_bulk_insert
+"""
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Concert, Ticket, insert_tickets
+
+QUANTITIES = [1, 10, 50, 100, 500, 1000]
+ROUNDS = 5
+
+def get_ticket_price(concert, seat_type):
+    """Same pricing rule as main.get_ticket_price"""
+    multipliers = {"GENERAL": 1.0, "VIP": 2.5, "BACKSTAGE": 4.0}
+    return concert.min_price * multipliers.get(seat_type, 1.0)
+
+def orm_loop(db, concert, quantity):
+    """Original path: one ORM object, price and timestamp per unit"""
+    tickets = []
+    for _ in range(quantity):
+        ticket = Ticket(
+            concert_id=concert.id,
+            user_id=1,
+            seat_type="GENERAL",
+            status="RESERVED",
+            amount=get_ticket_price(concert, "GENERAL"),
+            booking_time=datetime.now()
+        )
+        db.add(ticket)
+        tickets.append(ticket)
+    db.commit()
+    return [t.id for t in tickets]
+
+def bulk_insert(db, concert, quantity):
+    """New path: price computed once, one multi-row INSERT ... RETURNING"""
+    ticket_ids = insert_tickets(db, quantity, {
+        "concert_id": concert.id,
+        "user_id": 1,
+        "seat_type": "GENERAL",
+        "status": "RESERVED",
+        "amount": get_ticket_price(concert, "GENERAL"),
+        "booking_time": datetime.now()
+    })
+    db.commit()
+    return ticket_ids
+
+def time_strategy(session_factory, strategy, quantity):
+    """Median wall time in milliseconds over ROUNDS runs"""
+    timings = []
+    for _ in range(ROUNDS):
+        db = session_factory()
+        try:
+            concert = db.query(Concert).first()
+            start = time.perf_counter()
+            ticket_ids = strategy(db, concert, quantity)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert len(ticket_ids) == quantity
+        finally:
+            db.close()
+    return statistics.median(timings)
+
+def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        db = session_factory()
+        db.add(Concert(
+            name="Benchmark Concert",
+            artist="Benchmark",
+            date=datetime.now() + timedelta(days=30),
+            venue="Bench Hall",
+            genre="Rock",
+            min_price=50.0,
+            capacity=1_000_000
+        ))
+        db.commit()
+        db.close()
+
+        results = []
+        for quantity in QUANTITIES:
+            before = time_strategy(session_factory, orm_loop, quantity)
+            after = time_strategy(session_factory, bulk_insert, quantity)
+            results.append((quantity, before, after))
+        engine.dispose()
+    return results
+
+def print_report(results):
+    print("\nTicket Insert Latency (median ms)")
+    print("-" * 48)
+    print(f"{'quantity':>8} {'orm loop':>12} {'bulk insert':>12} {'speedup':>10}")
+    for quantity, before, after in results:
+        print(f"{quantity:>8} {before:>12.2f} {after:>12.2f} {before / after:>9.1f}x")
+
+if __name__ == '__main__':
+    print_report(run_benchmark())
@@ -0,0 +1,96 @@
+"""
+Benchmark /concerts page latency against page depth.
+
+Runs the offset query and the keyset (cursor) query used by get_concerts
+on a scratch SQLite catalogue. Run from the app directory:
+
+    python -m benchmarks.bench_concert_pagination
+"""
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, select, tuple_
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Concert
+
+CONCERT_COUNT = 200_000
+PAGE_SIZE = 10
+DEPTHS = [0, 100, 1_000, 10_000, 19_000]  # page numbers
+RUNS = 15
+
+def catalogue_query(position=None):
+    """Same filter and ordering as get_concerts"""
+    if position:
+        query = select(Concert).where(tuple_(Concert.date, Concert.id) > tuple(position))
+    else:
+        query = select(Concert).where(Concert.date >= datetime.now())
+    return query.order_by(Concert.date, Concert.id)
+
+def load_catalogue(engine):
+    Base.metadata.create_all(bind=engine)
+    start = datetime.now() + timedelta(days=1)
+    with engine.begin() as conn:
+        conn.execute(Concert.__table__.insert(), [
+            {
+                "name": f"Concert {i}",
+                "artist": f"Artist {i % 500}",
+                # Several concerts share a date so the id tiebreak matters
+                "date": start + timedelta(minutes=i // 4),
+                "venue": "Bench Hall",
+                "genre": "Rock",
+                "min_price": 50.0,
+                "capacity": 1000
+            }
+            for i in range(CONCERT_COUNT)
+        ])
+
+def median_ms(fn):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def run_benchmark():
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        load_catalogue(engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            for page in DEPTHS:
+                skip = page * PAGE_SIZE
+                # The cursor a client would hold after reading the previous page
+                previous = db.execute(
+                    catalogue_query().with_only_columns(Concert.date, Concert.id).offset(skip - 1).limit(1)
+                ).one() if skip else None
+
+                def offset_page():
+                    return db.scalars(catalogue_query().offset(skip).limit(PAGE_SIZE)).all()
+
+                def keyset_page():
+                    query = catalogue_query(previous)
+                    return db.scalars(query.limit(PAGE_SIZE + 1)).all()[:PAGE_SIZE]
+
+                assert [c.id for c in offset_page()] == [c.id for c in keyset_page()]
+                db.expunge_all()
+                results.append((page, median_ms(offset_page), median_ms(keyset_page)))
+        finally:
+            db.close()
+            engine.dispose()
+    return results
+
+def print_report(results):
+    print(f"\nConcert Page Latency at {CONCERT_COUNT} concerts (median ms)")
+    print("-" * 48)
+    print(f"{'page':>8} {'offset':>12} {'cursor':>12} {'speedup':>10}")
+    for page, offset_ms, keyset_ms in results:
+        print(f"{page:>8} {offset_ms:>12.3f} {keyset_ms:>12.3f} {offset_ms / keyset_ms:>9.1f}x")
+
+if __name__ == '__main__':
+    print_report(run_benchmark())
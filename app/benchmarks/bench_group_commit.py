@@ -0,0 +1,122 @@
+"""
+Benchmark reservation throughput with per-request commits and group commit.
+
+Each of N concurrent clients places ORDERS_PER_CLIENT single-ticket
+reservations against one concert on a scratch SQLite database configured
+like the app's (WAL, pooled asyncio engine). Run from the app directory:
+
+    python -m benchmarks.bench_group_commit
+"""
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import Base, Concert, create_database_engine, create_inventory, place_order
+from group_commit import GroupCommitter
+
+CLIENTS = [50, 200, 1000]
+ORDERS_PER_CLIENT = 5
+
+def ticket_fields(concert_id, client):
+    return {
+        "concert_id": concert_id,
+        "user_id": client,
+        "status": "RESERVED",
+        "amount": 50.0,
+        "seat_type": "GENERAL",
+        "booking_time": datetime.now(),
+        "reservation_expiry": datetime.now() + timedelta(minutes=15)
+    }
+
+async def setup_concert(session_factory, engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as db:
+        concert = Concert(
+            name="Benchmark Concert",
+            artist="Benchmark",
+            date=datetime.now() + timedelta(days=30),
+            venue="Bench Hall",
+            genre="Rock",
+            min_price=50.0,
+            capacity=10_000_000
+        )
+        db.add(concert)
+        await db.flush()
+        await db.run_sync(create_inventory, concert)
+        await db.commit()
+        return concert.id
+
+async def per_request_order(session_factory, concert_id, client):
+    async with session_factory() as db:
+        result = await db.run_sync(place_order, concert_id, "GENERAL", 1, ticket_fields(concert_id, client))
+        await db.commit()
+        return result
+
+async def run_clients(clients, place):
+    """
+    Run closed-loop clients.
+
+    Returns:
+        tuple: (committed orders/sec, per-order latencies in ms, failed orders)
+    """
+    latencies = []
+    errors = 0
+
+    async def client(n):
+        nonlocal errors
+        for _ in range(ORDERS_PER_CLIENT):
+            start = time.perf_counter()
+            try:
+                assert await place(n) is not None
+            except Exception:
+                # Typically "database is locked" once busy_timeout runs out
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(n) for n in range(clients)])
+    return len(latencies) / (time.perf_counter() - start), latencies, errors
+
+async def run_benchmark():
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_database_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}", use_async=True)
+        session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        concert_id = await setup_concert(session_factory, engine)
+        committer = GroupCommitter(session_factory)
+        try:
+            for clients in CLIENTS:
+                before = await run_clients(
+                    clients, lambda n: per_request_order(session_factory, concert_id, n)
+                )
+                after = await run_clients(
+                    clients, lambda n: committer.submit(concert_id, "GENERAL", 1, ticket_fields(concert_id, n))
+                )
+                results.append((clients, before, after))
+        finally:
+            await committer.close()
+            await engine.dispose()
+    return results, committer.stats()
+
+def p95(latencies):
+    return statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0
+
+def print_report(results, stats):
+    print("\nReservation Throughput (committed orders/sec, p95 ms, failed orders)")
+    print("-" * 80)
+    print(f"{'clients':>8} {'per-request':>12} {'p95':>9} {'failed':>7} "
+          f"{'group commit':>13} {'p95':>9} {'failed':>7} {'speedup':>9}")
+    for clients, (before, before_lat, before_err), (after, after_lat, after_err) in results:
+        print(f"{clients:>8} {before:>12.0f} {p95(before_lat):>9.1f} {before_err:>7} "
+              f"{after:>13.0f} {p95(after_lat):>9.1f} {after_err:>7} {after / before:>8.1f}x")
+    print(f"\nGroup commit: {stats['batches']} batches, {stats['avg_batch_size']:.1f} orders per batch on average")
+
+if __name__ == '__main__':
+    print_report(*asyncio.run(run_benchmark()))
@@ -0,0 +1,157 @@
+"""
+Benchmark ticket lookups at 1M tickets before and after migrate_database.
+
+Loads a scratch SQLite database with only the original id index on
+tickets, times the availability count, confirm/cancel lookup, per-user
+lookup and reservation sweep query, then adds the composite indexes with
+migrate_database and times them again. Run from the app directory:
+
+    python -m benchmarks.bench_ticket_indexes [ticket_count]
+"""
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Concert, Ticket, UserProfile, migrate_database
+
+TICKET_COUNT = 1_000_000
+CONCERT_COUNT = 1_000
+USER_COUNT = 50_000
+SEAT_TYPES = ["GENERAL", "VIP", "BACKSTAGE"]
+STATUSES = ["RESERVED"] * 10 + ["CONFIRMED"] * 70 + ["CANCELLED"] * 15 + ["EXPIRED"] * 5
+RUNS = 25
+
+def load_data(engine, ticket_count):
+    """Create the original schema and bulk load tickets"""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # Start from the schema as it was: tickets only indexed by id
+        for index in Ticket.__table__.indexes:
+            if index.name != "ix_tickets_id":
+                conn.execute(text(f"DROP INDEX {index.name}"))
+
+        now = datetime.now()
+        conn.execute(Concert.__table__.insert(), [
+            {
+                "name": f"Concert {i}",
+                "artist": f"Artist {i}",
+                "date": now + timedelta(days=30),
+                "venue": "Bench Hall",
+                "genre": "Rock",
+                "min_price": 50.0,
+                "capacity": ticket_count
+            }
+            for i in range(CONCERT_COUNT)
+        ])
+        conn.execute(UserProfile.__table__.insert(), [
+            {"email": f"user{i}@example.com", "name": f"User {i}"}
+            for i in range(USER_COUNT)
+        ])
+
+        rng = random.Random(42)
+        batch = []
+        for _ in range(ticket_count):
+            status = rng.choice(STATUSES)
+            batch.append({
+                "concert_id": rng.randint(1, CONCERT_COUNT),
+                "user_id": rng.randint(1, USER_COUNT),
+                "seat_type": rng.choice(SEAT_TYPES),
+                "status": status,
+                "amount": 50.0,
+                "booking_time": now,
+                "reservation_expiry": now + timedelta(minutes=rng.randint(-120, 15)) if status == "RESERVED" else None
+            })
+            if len(batch) == 50_000:
+                conn.execute(Ticket.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(Ticket.__table__.insert(), batch)
+        conn.execute(text("ANALYZE"))
+
+def sample_reservations(engine):
+    """(id, user_id) of RUNS seeded RESERVED tickets, as confirm/cancel sends them"""
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, user_id FROM tickets WHERE status = 'RESERVED'")).all()
+    return random.Random(7).sample(rows, min(RUNS, len(rows)))
+
+def time_queries(session_factory, reservations):
+    """Median milliseconds per access pattern"""
+    rng = random.Random(7)
+    lookups = iter(reservations)
+    db = session_factory()
+
+    def confirm_cancel_lookup():
+        ticket_id, user_id = next(lookups)
+        return db.query(Ticket).filter(
+            Ticket.id == ticket_id,
+            Ticket.user_id == user_id,
+            Ticket.status == "RESERVED"
+        ).first()
+
+    patterns = {
+        "availability count": lambda: db.query(Ticket).filter(
+            Ticket.concert_id == rng.randint(1, CONCERT_COUNT),
+            Ticket.seat_type == rng.choice(SEAT_TYPES),
+            Ticket.status.in_(["RESERVED", "CONFIRMED"])
+        ).count(),
+        "confirm/cancel lookup": confirm_cancel_lookup,
+        "per-user tickets": lambda: db.query(Ticket).filter(
+            Ticket.user_id == rng.randint(1, USER_COUNT),
+            Ticket.status == "CONFIRMED"
+        ).all(),
+        "due reservations": lambda: db.query(Ticket.id).filter(
+            Ticket.status == "RESERVED",
+            Ticket.reservation_expiry < datetime.now()
+        ).limit(500).all(),
+    }
+    results = {}
+    try:
+        for name, query in patterns.items():
+            timings = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                query()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+    finally:
+        db.close()
+    return results
+
+def run_benchmark(ticket_count):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        session_factory = sessionmaker(bind=engine)
+
+        start = time.perf_counter()
+        load_data(engine, ticket_count)
+        print(f"Loaded {ticket_count} tickets in {time.perf_counter() - start:.1f}s")
+        reservations = sample_reservations(engine)
+        before = time_queries(session_factory, reservations)
+
+        start = time.perf_counter()
+        migration = migrate_database(bind=engine)
+        print(f"Migration created {len(migration['indexes'])} indexes and "
+              f"{migration['inventory_rows']} inventory rows in {time.perf_counter() - start:.1f}s")
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        after = time_queries(session_factory, reservations)
+        engine.dispose()
+    return before, after
+
+def print_report(before, after):
+    print("\nTicket Query Latency (median ms)")
+    print("-" * 60)
+    print(f"{'query':<24} {'before':>10} {'after':>10} {'speedup':>10}")
+    for name in before:
+        print(f"{name:<24} {before[name]:>10.3f} {after[name]:>10.3f} {before[name] / after[name]:>9.1f}x")
+
+if __name__ == '__main__':
+    TICKET_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else TICKET_COUNT
+    print_report(*run_benchmark(TICKET_COUNT))
@@ -0,0 +1,135 @@
+"""
+Benchmark the per-request overhead of TimingMiddleware.
+
+Drives minimal ASGI apps directly, with and without the middleware, so
+the difference is the middleware's cost rather than HTTP time. The
+middleware is built as main.py builds it, with logging through the queued
+writer. Its own overhead, around a handler that does nothing, must stay
+within OVERHEAD_BUDGET_US with the default settings. Around a handler
+running two SQL statements, like a typical endpoint, the defaults and the
+opt-in QUERY_MONITOR=1 and ACCESS_LOG=1 are reported but not held to it;
+a few microseconds there are lost in the noise of the queries. Exits with
+status 1 when over budget. Run from the app directory:
+
+    python -m benchmarks.bench_timing_middleware
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+from logging_config import configure_logging
+from monitoring import ServiceMonitor, TimingMiddleware
+from query_monitor import QueryMonitor
+
+REQUESTS = 20_000
+ROUNDS = 5
+
+# Most the middleware may add to a request with the default settings, in
+# microseconds
+OVERHEAD_BUDGET_US = 10
+
+class Route:
+    """Stands in for the route FastAPI's router stores in the scope"""
+    path = "/concerts/{concert_id}"
+
+async def empty_endpoint(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+def make_endpoint(conn):
+    async def endpoint(scope, receive, send):
+        scope["route"] = Route
+        conn.execute(text("SELECT 1 WHERE 1 = :concert_id"), {"concert_id": 7})
+        conn.execute(text("SELECT 2 WHERE 2 IN (1, 2, 3)"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return endpoint
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+async def send(message):
+    pass
+
+async def time_apps(apps: dict) -> dict:
+    """
+    Median microseconds per request of each app over ROUNDS runs of
+    REQUESTS calls. The apps take turns each round, so drift in machine
+    speed affects them alike.
+    """
+    timings = {name: [] for name in apps}
+    for _ in range(ROUNDS):
+        for name, app in apps.items():
+            start = time.perf_counter_ns()
+            for _ in range(REQUESTS):
+                await app({"type": "http", "method": "GET", "path": "/concerts/7", "headers": []}, receive, send)
+            timings[name].append((time.perf_counter_ns() - start) / REQUESTS / 1000)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+def shipped_middleware(endpoint, query_monitor=None, access_log=False):
+    """TimingMiddleware with the arguments main.py passes it"""
+    monitor = ServiceMonitor()
+    if query_monitor is not None:
+        monitor.register_query_monitor(query_monitor)
+    return TimingMiddleware(
+        endpoint, monitor, query_monitor=query_monitor,
+        debug_headers=False, access_log=access_log
+    )
+
+async def run_benchmark():
+    engine = create_engine("sqlite://")
+    # QUERY_MONITOR=1 hooks the engine, so it gets one of its own
+    monitored_engine = create_engine("sqlite://")
+    query_monitor = QueryMonitor()
+    query_monitor.instrument(monitored_engine)
+    with engine.connect() as conn, monitored_engine.connect() as monitored_conn, \
+            tempfile.TemporaryDirectory() as log_dir:
+        listener = configure_logging(os.path.join(log_dir, "bench.log"))
+        try:
+            overhead = await time_apps({
+                "bare app": empty_endpoint,
+                "as in main.py": shipped_middleware(empty_endpoint)
+            })
+            endpoint = make_endpoint(conn)
+            with_queries = await time_apps({
+                "bare app": endpoint,
+                "as in main.py": shipped_middleware(endpoint),
+                "QUERY_MONITOR=1": shipped_middleware(make_endpoint(monitored_conn), query_monitor)
+            })
+            # Last: its writer thread keeps draining records after the round
+            with_queries.update(await time_apps({"ACCESS_LOG=1": shipped_middleware(endpoint, access_log=True)}))
+        finally:
+            listener.stop()
+            logging.getLogger().handlers.clear()
+    engine.dispose()
+    monitored_engine.dispose()
+    return overhead, with_queries
+
+def print_table(title, results):
+    bare = results["bare app"]
+    print(f"\n{title} (median us/request)")
+    print("-" * 48)
+    print(f"{'':<20} {'total':>12} {'overhead':>12}")
+    for name, timing in results.items():
+        print(f"{name:<20} {timing:>12.2f} {timing - bare:>12.2f}")
+
+def print_report(results) -> bool:
+    """Print the timings and whether the default overhead is within budget"""
+    overhead, with_queries = results
+    print_table("TimingMiddleware Overhead, empty handler", overhead)
+    print_table("Handler running two SQL statements", with_queries)
+    added = overhead["as in main.py"] - overhead["bare app"]
+    within_budget = added <= OVERHEAD_BUDGET_US
+    print(f"\nDefault overhead {added:.2f}us, budget {OVERHEAD_BUDGET_US}us: "
+          f"{'ok' if within_budget else 'OVER BUDGET'}")
+    return within_budget
+
+if __name__ == '__main__':
+    sys.exit(0 if print_report(asyncio.run(run_benchmark())) else 1)
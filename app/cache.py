@@ -0,0 +1,350 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+class CachedResponse:
+    """A JSON response body serialized once, with the ETag that identifies it"""
+
+    def __init__(self, payload, item_count: int, expires_at: float):
+        self.body = JSONResponse(content=jsonable_encoder(payload)).body
+        self.etag = f'"{hashlib.blake2b(self.body, digest_size=16).hexdigest()}"'
+        self.item_count = item_count
+        self.expires_at = expires_at
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header already names this response"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in [tag.removeprefix("W/") for tag in tags]
+
+class CatalogueCache:
+    """
+    Serialized /concerts responses keyed by catalogue version and request.
+
+    Entries are only valid for the catalogue version they were built from,
+    so bumping the version invalidates every page at once. The TTL bounds
+    how long a page can lag behind concerts dropping out of the upcoming
+    list as their date passes.
+    """
+
+    def __init__(self, ttl: float = 30, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._version: Optional[Hashable] = None
+        self._entries: Dict[Hashable, CachedResponse] = {}
+
+    def get(self, version: Hashable, key: Hashable) -> Optional[CachedResponse]:
+        if version != self._version:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
+            return None
+        return entry
+
+    def put(self, version: Hashable, key: Hashable, payload, item_count: int) -> CachedResponse:
+        entry = CachedResponse(payload, item_count, time.monotonic() + self.ttl)
+        if version != self._version:
+            # Pages from older catalogue versions can never be served again
+            self._entries.clear()
+            self._version = version
+        elif key not in self._entries and len(self._entries) >= self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self._version = None
+
+class MemoryAvailabilityCache:
+    """
+    Availability counts kept in this process only.
+
+    Entries are keyed by (concert_id, seat_type), expire after `ttl` seconds
+    and are evicted least recently used first once `max_entries` is reached.
+    A per-concert index of cached seat types makes invalidating a concert
+    independent of the cache size.
+
+    Counts carry the inventory version they were read at and only move
+    forward, so write-throughs and fills may land in any order. stamp()
+    hands out a ticket from a logical clock; a fill takes it before reading
+    the database and passes it to set(), so a count computed before an
+    invalidation of that concert is dropped instead of cached.
+    """
+
+    # Calls never wait on I/O, so async callers make them inline
+    blocking = False
+
+    def __init__(self, ttl: float = 300, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[float, int, int]]" = OrderedDict()
+        self._seat_types: Dict[int, Set[str]] = {}
+        # Clock value of each concert's latest invalidation; once bounded
+        # out, older ones are covered conservatively by _stamp_floor
+        self._clock = 0
+        self._invalidated: "OrderedDict[int, int]" = OrderedDict()
+        self._stamp_floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, concert_id: int, seat_type: str) -> Optional[int]:
+        key = (concert_id, seat_type)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def stamp(self, concert_id: int) -> int:
+        self._clock += 1
+        return self._clock
+
+    def set(self, concert_id: int, seat_type: str, count: int, stamp: Optional[int] = None, version: int = 0):
+        """
+        Cache `count` as of inventory `version`.
+
+        Write-throughs of a committed count pass no stamp; fills pass the
+        stamp they took before reading.
+        """
+        if stamp is not None and stamp <= max(self._invalidated.get(concert_id, 0), self._stamp_floor):
+            return
+        key = (concert_id, seat_type)
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > version:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, count, version)
+        self._entries.move_to_end(key)
+        self._seat_types.setdefault(concert_id, set()).add(seat_type)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_concert(self, concert_id: int):
+        self._clock += 1
+        self._invalidated[concert_id] = self._clock
+        self._invalidated.move_to_end(concert_id)
+        if len(self._invalidated) > self.max_entries:
+            _, clock = self._invalidated.popitem(last=False)
+            self._stamp_floor = max(self._stamp_floor, clock)
+        for seat_type in self._seat_types.pop(concert_id, ()):
+            del self._entries[(concert_id, seat_type)]
+
+    def clear(self):
+        self._entries.clear()
+        self._seat_types.clear()
+        self._invalidated.clear()
+        self._stamp_floor = self._clock
+
+    def _remove(self, key: Tuple[int, str]):
+        del self._entries[key]
+        seat_types = self._seat_types[key[0]]
+        seat_types.discard(key[1])
+        if not seat_types:
+            del self._seat_types[key[0]]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) * 100 if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+class SQLiteAvailabilityCache:
+    """
+    Availability counts shared by every worker process on one machine.
+
+    Entries live in a small SQLite file next to the app, so an invalidation
+    in one uvicorn worker is seen by all of them without an outside service.
+    An entry is only served while its stamp matches the concert's current
+    stamp, which invalidate_concert bumps, and a count never replaces one
+    from a newer inventory version. The file holds nothing durable, so it
+    runs in WAL mode without fsync, is rebuilt when SCHEMA_VERSION changes
+    and each call is a local primary-key read or write.
+
+    Every PURGE_INTERVAL writes a worker deletes expired rows and, past
+    `max_entries`, the rows closest to expiry, i.e. the least recently
+    written ones.
+    """
+
+    # A write from another worker can hold a call for up to the busy
+    # timeout, so async callers run calls in a thread
+    blocking = True
+    SCHEMA_VERSION = 3
+    PURGE_INTERVAL = 100
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS availability (
+            concert_id INTEGER NOT NULL,
+            seat_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            stamp INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (concert_id, seat_type)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS ix_availability_expires_at ON availability (expires_at)",
+        """CREATE TABLE IF NOT EXISTS concert_stamps (
+            concert_id INTEGER PRIMARY KEY,
+            stamp INTEGER NOT NULL
+        )""",
+    ]
+
+    def __init__(self, path: str = "availability_cache.db", ttl: float = 300, max_entries: int = 10_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+        # Lookups made and rows purged by this worker
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                    conn.execute("DROP TABLE IF EXISTS availability")
+                    conn.execute("DROP TABLE IF EXISTS concert_stamps")
+                    conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection().execute(sql, params)
+
+    def get(self, concert_id: int, seat_type: str) -> Optional[int]:
+        row = self._execute(
+            """SELECT a.count FROM availability a
+            LEFT JOIN concert_stamps s ON s.concert_id = a.concert_id
+            WHERE a.concert_id = ? AND a.seat_type = ?
+            AND a.stamp = COALESCE(s.stamp, 0) AND a.expires_at > ?""",
+            (concert_id, seat_type, time.time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def stamp(self, concert_id: int) -> int:
+        row = self._execute(
+            "SELECT stamp FROM concert_stamps WHERE concert_id = ?", (concert_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def set(self, concert_id: int, seat_type: str, count: int, stamp: Optional[int] = None, version: int = 0):
+        """
+        Cache `count` as of inventory `version`.
+
+        Write-throughs of a committed count pass no stamp; fills pass the
+        stamp they took before reading.
+        """
+        self._execute(
+            """INSERT INTO availability (concert_id, seat_type, count, version, stamp, expires_at)
+            SELECT ?, ?, ?, ?, current.stamp, ?
+            FROM (SELECT COALESCE((SELECT stamp FROM concert_stamps WHERE concert_id = ?), 0) AS stamp) current
+            WHERE ? IS NULL OR ? = current.stamp
+            ON CONFLICT (concert_id, seat_type) DO UPDATE SET
+                count = excluded.count, version = excluded.version,
+                stamp = excluded.stamp, expires_at = excluded.expires_at
+            WHERE excluded.version >= availability.version OR excluded.stamp != availability.stamp""",
+            (concert_id, seat_type, count, version, time.time() + self.ttl, concert_id, stamp, stamp)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            self.purge()
+
+    def purge(self):
+        """Delete expired rows, then the oldest rows beyond max_entries"""
+        self.expirations += self._execute(
+            "DELETE FROM availability WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+        self.evictions += self._execute(
+            """DELETE FROM availability WHERE (concert_id, seat_type) IN (
+                SELECT concert_id, seat_type FROM availability ORDER BY expires_at
+                LIMIT max((SELECT count(*) FROM availability) - ?, 0)
+            )""",
+            (self.max_entries,)
+        ).rowcount
+
+    def invalidate_concert(self, concert_id: int):
+        self._execute(
+            """INSERT INTO concert_stamps (concert_id, stamp) VALUES (?, 1)
+            ON CONFLICT (concert_id) DO UPDATE SET stamp = stamp + 1""",
+            (concert_id,)
+        )
+        self._execute("DELETE FROM availability WHERE concert_id = ?", (concert_id,))
+
+    def clear(self):
+        self._execute("DELETE FROM availability")
+        self._execute("DELETE FROM concert_stamps")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite",
+            "size": self._execute("SELECT count(*) FROM availability").fetchone()[0],
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) * 100 if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+def create_availability_cache(
+    backend: str = "memory",
+    ttl: float = 300,
+    path: str = "availability_cache.db",
+    max_entries: int = 10_000
+):
+    """
+    Build the availability cache selected by configuration.
+
+    Args:
+        backend: "memory" for a per-process cache, "sqlite" to share one
+            cache between all worker processes on the machine
+        ttl: Seconds an entry may be served
+        path: SQLite file used by the "sqlite" backend
+        max_entries: Size bound of either backend
+    """
+    if backend == "memory":
+        return MemoryAvailabilityCache(ttl=ttl, max_entries=max_entries)
+    if backend == "sqlite":
+        return SQLiteAvailabilityCache(path=path, ttl=ttl, max_entries=max_entries)
+    raise ValueError(f"Unknown availability cache backend: {backend}")
@@ -0,0 +1,358 @@
+"""
+Metrics shared by show_metrics.py, test_metrics.py and run_tests.py.
+
+JMeter results are summarized from JTL files. Code coverage is read from
+the XML report pytest-cov writes and cached against a hash of the Python
+source, so the test suite only runs again after the code changes.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from monitoring import LatencyHistogram
+
+APP_DIR = Path(__file__).resolve().parent
+
+# Only these JTL columns are read when streaming, with compact dtypes.
+# responseCode stays text: JMeter writes messages like
+# "Non HTTP response code: ..." for connection failures
+JTL_DTYPES = {
+    'timeStamp': 'int64',
+    'label': 'category',
+    'responseCode': 'category',
+    'Latency': 'int32'
+}
+
+# Rows per chunk when streaming, and the file size that switches to it
+STREAMING_CHUNK_ROWS = 1_000_000
+STREAMING_THRESHOLD_BYTES = 512 * 1024 * 1024
+
+# Latency threshold (ms) for a request to count as reliable
+RELIABLE_LATENCY_MS = 1000
+
+# Percentiles reported per label and per interval, and the most intervals
+# a run is split into, which also bounds the points plotted
+PERCENTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+MAX_INTERVALS = 300
+
+# Bucket growth of the streaming histograms, so percentiles are within 1%
+HISTOGRAM_GROWTH = 1.01
+
+def latency_histogram():
+    """Empty histogram for JTL latencies, which are whole milliseconds"""
+    return LatencyHistogram(min_value=1, growth=HISTOGRAM_GROWTH)
+
+def interval_seconds(first, last):
+    """
+    Seconds per interval so a run from `first` to `last` (epoch seconds)
+    spans at most MAX_INTERVALS epoch-aligned intervals.
+
+    Widths are powers of two, so intervals counted while a run is streamed
+    fold into the wider ones a longer run needs on the same boundaries.
+    """
+    width = 1
+    while last // width - first // width >= MAX_INTERVALS:
+        width *= 2
+    return width
+
+def summarize_groups(groups, seconds):
+    """
+    Requests, throughput, error rate and exact latency percentiles per group
+    
+    Args:
+        groups: DataFrame grouped by the breakdown key, with Latency and error columns
+        seconds: Time the requests of each group were spread over
+    """
+    summary = pd.DataFrame({'requests': groups['Latency'].size()})
+    summary['throughput'] = summary['requests'] / seconds if seconds > 0 else 0
+    summary['error_rate'] = groups['error'].mean() * 100
+    summary['avg_latency'] = groups['Latency'].mean()
+    percentiles = groups['Latency'].quantile(list(PERCENTILES.values())).unstack()
+    percentiles.columns = list(PERCENTILES)
+    return summary.join(percentiles)
+
+def summarize_histograms(totals, seconds, histogram):
+    """
+    Same breakdown as summarize_groups, from per-group bucket counts
+    
+    Args:
+        totals: DataFrame indexed by (group, bucket) with requests, errors and latency_sum
+        seconds: Time the requests of each group were spread over
+        histogram: LatencyHistogram whose buckets index `totals`
+    """
+    groups = totals.groupby(level=0)
+    summed = groups.sum()
+    summary = pd.DataFrame({'requests': summed['requests']})
+    summary['throughput'] = summary['requests'] / seconds if seconds > 0 else 0
+    summary['error_rate'] = summed['errors'] / summed['requests'] * 100
+    summary['avg_latency'] = summed['latency_sum'] / summed['requests']
+    
+    # Percentile q of a group is the first bucket whose running count reaches q
+    running = groups['requests'].cumsum()
+    group_totals = groups['requests'].transform('sum')
+    keys = totals.index.get_level_values(0)
+    buckets = totals.index.get_level_values(1)
+    for name, q in PERCENTILES.items():
+        reached = (running >= q * group_totals).to_numpy()
+        first = pd.Series(buckets[reached], index=keys[reached]).groupby(level=0).min()
+        summary[name] = pd.Series(histogram.bucket_values(first.to_numpy()), index=first.index)
+    return summary
+
+def jmeter_metrics(results_file, chunksize=None, interval=None):
+    """
+    Request, availability, latency and throughput metrics of a JTL file
+    
+    Args:
+        results_file: Path to the JTL file containing JMeter results
+        chunksize: Rows per chunk to stream the file with bounded memory.
+            Files over STREAMING_THRESHOLD_BYTES are streamed by default
+        interval: Seconds per time bucket in the per-interval breakdown.
+            Defaults to the run split into at most MAX_INTERVALS buckets
+    Returns:
+        Dictionary containing various performance metrics, plus `by_label`
+        and `by_interval` DataFrames with throughput, error rate and
+        latency percentiles per sampler and per time bucket
+    """
+    if chunksize is None and os.path.getsize(results_file) > STREAMING_THRESHOLD_BYTES:
+        chunksize = STREAMING_CHUNK_ROWS
+    if chunksize:
+        return stream_jmeter_metrics(results_file, chunksize, interval)
+    
+    # Read the JTL file into a pandas DataFrame
+    df = pd.read_csv(results_file)
+    
+    # Convert timestamp to datetime for better analysis
+    df['timeStamp'] = pd.to_datetime(df['timeStamp'], unit='ms')
+    
+    # Calculate basic metrics
+    successful = df['responseCode'].astype(str) == '200'
+    df['error'] = ~successful
+    total_requests = len(df)
+    successful_requests = int(successful.sum())
+    availability = (successful_requests / total_requests) * 100
+    
+    # Calculate reliability (responses under 1000ms threshold)
+    reliable_requests = int((successful & (df['Latency'] <= RELIABLE_LATENCY_MS)).sum())
+    reliability = (reliable_requests / total_requests) * 100
+    
+    # Calculate detailed latency metrics
+    latency_metrics = {
+        'avg_latency': df['Latency'].mean(),
+        'max_latency': df['Latency'].max(),
+        'min_latency': df['Latency'].min(),
+        'p95_latency': df['Latency'].quantile(0.95),
+        'p99_latency': df['Latency'].quantile(0.99)
+    }
+    
+    # Calculate throughput (requests per second)
+    first, last = df['timeStamp'].min(), df['timeStamp'].max()
+    duration = (last - first).total_seconds()
+    throughput = total_requests / duration if duration > 0 else 0
+    
+    # Break the run down per sampler and per time bucket
+    by_label = summarize_groups(df.groupby('label'), duration)
+    width = interval or interval_seconds(first.value // 10 ** 9, last.value // 10 ** 9)
+    by_interval = summarize_groups(df.groupby(df['timeStamp'].dt.floor(f'{width}s')), width)
+    by_interval.index.name = 'start'
+    
+    return {
+        'total_requests': total_requests,
+        'successful_requests': successful_requests,
+        'availability': availability,
+        'reliability': reliability,
+        'throughput': throughput,
+        **latency_metrics,
+        'by_label': by_label,
+        'by_interval': by_interval
+    }
+
+def stream_jmeter_metrics(results_file, chunksize=STREAMING_CHUNK_ROWS, interval=None):
+    """
+    Same metrics as jmeter_metrics, read in chunks with bounded memory.
+
+    Only the columns in JTL_DTYPES are parsed. Each chunk adds to running
+    counts, min/max and a LatencyHistogram, so percentiles are approximate
+    (within 1%) and memory does not grow with the file. The breakdowns keep
+    histogram bucket counts per label and per interval; when the run grows
+    past MAX_INTERVALS intervals, the counts so far are folded into the
+    next wider interval.
+    """
+    total_requests = 0
+    successful_requests = 0
+    reliable_requests = 0
+    latency_sum = 0
+    first_timestamp = None
+    last_timestamp = None
+    histogram = latency_histogram()
+    per_label = None
+    per_interval = None
+    width = interval
+    
+    for chunk in pd.read_csv(results_file, usecols=list(JTL_DTYPES), dtype=JTL_DTYPES, chunksize=chunksize):
+        successful = (chunk['responseCode'] == '200').to_numpy()
+        latency = chunk['Latency'].to_numpy()
+        total_requests += len(chunk)
+        successful_requests += int(successful.sum())
+        reliable_requests += int((successful & (latency <= RELIABLE_LATENCY_MS)).sum())
+        latency_sum += int(latency.sum(dtype=np.int64))
+        histogram.record_all(latency)
+        
+        timestamps = chunk['timeStamp']
+        low, high = int(timestamps.min()), int(timestamps.max())
+        first_timestamp = low if first_timestamp is None else min(first_timestamp, low)
+        last_timestamp = high if last_timestamp is None else max(last_timestamp, high)
+        if not interval:
+            width = interval_seconds(first_timestamp // 1000, last_timestamp // 1000)
+        
+        seconds = timestamps.to_numpy() // 1000
+        samples = pd.DataFrame({
+            'label': chunk['label'].astype(str),
+            'start': seconds - seconds % width,
+            'bucket': histogram.bucket_indexes(latency),
+            'requests': 1,
+            'errors': ~successful,
+            'latency_sum': latency.astype(np.int64)
+        })
+        if per_interval is not None:
+            starts = per_interval.index.get_level_values('start')
+            if (starts % width).any():
+                # The run outgrew the interval width; fold into the new one
+                per_interval = per_interval.groupby([starts - starts % width, per_interval.index.get_level_values('bucket')]).sum()
+        # Groups split across chunks are summed into the running totals
+        per_label = _add_counts(per_label, samples.groupby(['label', 'bucket'])[['requests', 'errors', 'latency_sum']].sum())
+        per_interval = _add_counts(per_interval, samples.groupby(['start', 'bucket'])[['requests', 'errors', 'latency_sum']].sum())
+    
+    if not total_requests:
+        raise ValueError(f"No samples in {results_file}")
+    
+    duration = (last_timestamp - first_timestamp) / 1000
+    per_interval.index = per_interval.index.set_levels(
+        pd.to_datetime(per_interval.index.levels[0], unit='s'), level='start'
+    )
+    by_interval = summarize_histograms(per_interval, width, histogram)
+    by_interval.index.name = 'start'
+    
+    return {
+        'total_requests': total_requests,
+        'successful_requests': successful_requests,
+        'availability': (successful_requests / total_requests) * 100,
+        'reliability': (reliable_requests / total_requests) * 100,
+        'throughput': total_requests / duration if duration > 0 else 0,
+        'avg_latency': latency_sum / total_requests,
+        'max_latency': histogram.max,
+        'min_latency': histogram.min,
+        'p95_latency': histogram.percentile(0.95),
+        'p99_latency': histogram.percentile(0.99),
+        'by_label': summarize_histograms(per_label, duration, histogram),
+        'by_interval': by_interval
+    }
+
+def _add_counts(totals, counts):
+    """Sum two bucket count tables indexed the same way"""
+    if totals is None:
+        return counts
+    return totals.add(counts, fill_value=0).astype(np.int64)
+
+# Coverage report written by pytest-cov, and the percentage read from it
+# together with the source tree and report it came from
+COVERAGE_XML = APP_DIR / 'coverage' / 'coverage.xml'
+COVERAGE_CACHE = APP_DIR / 'coverage' / 'coverage_cache.json'
+COVERAGE_COMMAND = [
+    sys.executable, '-m', 'pytest', '-q',
+    '--cov=.', f'--cov-report=xml:{COVERAGE_XML}',
+    'tests'
+]
+
+def source_tree_hash():
+    """
+    Hash of the Python source in the working copy, or None outside a git checkout
+
+    Covers the current contents of every tracked or unignored *.py file,
+    so edits change it but generated files such as results.jtl or
+    concerts.db, rewritten by every test run, do not.
+    """
+    try:
+        def git(*args, stdin=None):
+            return subprocess.run(['git', *args], cwd=APP_DIR, input=stdin, capture_output=True,
+                                  text=True, check=True).stdout
+        paths = sorted(path for path in git('ls-files', '--cached', '--others', '--exclude-standard', '*.py').splitlines()
+                       if (APP_DIR / path).exists())
+        blobs = git('hash-object', '--stdin-paths', stdin='\n'.join(str(APP_DIR / path) for path in paths)).split()
+        return hashlib.sha1('\n'.join(f'{path} {blob}' for path, blob in zip(paths, blobs)).encode()).hexdigest()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def read_coverage_xml(xml_path=COVERAGE_XML):
+    """Line coverage percentage from a Cobertura XML report"""
+    import xml.etree.ElementTree as ET
+    return float(ET.parse(xml_path).getroot().attrib['line-rate']) * 100
+
+def record_coverage(tree=None, xml_path=COVERAGE_XML, cache_path=COVERAGE_CACHE):
+    """
+    Read a freshly written coverage report and cache it for the current tree
+
+    Call after any pytest --cov run that wrote `xml_path`.
+    """
+    coverage = read_coverage_xml(xml_path)
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps({
+        'tree': tree or source_tree_hash(),
+        'xml_mtime': os.stat(xml_path).st_mtime_ns,
+        'coverage': coverage
+    }))
+    return coverage
+
+def run_coverage(xml_path=COVERAGE_XML):
+    """Run the test suite under pytest-cov to write `xml_path`"""
+    # A stale report left behind by a failed run must not be recorded
+    Path(xml_path).unlink(missing_ok=True)
+    Path(xml_path).parent.mkdir(parents=True, exist_ok=True)
+    subprocess.run(COVERAGE_COMMAND, cwd=APP_DIR, capture_output=True, check=False)
+
+def code_coverage(run=True, xml_path=COVERAGE_XML, cache_path=COVERAGE_CACHE):
+    """
+    Line coverage percentage of the current source, default to 0 if unavailable
+
+    The cached percentage is reused while the source tree hash and the
+    report's mtime are unchanged. A report rewritten for the same tree is
+    read again. Otherwise the suite is rerun if `run` is set.
+    """
+    tree = source_tree_hash()
+    try:
+        cached = json.loads(Path(cache_path).read_text())
+    except (OSError, ValueError):
+        cached = {}
+    
+    try:
+        if tree and cached.get('tree') == tree and os.path.exists(xml_path):
+            if cached.get('xml_mtime') == os.stat(xml_path).st_mtime_ns:
+                return cached['coverage']
+            return record_coverage(tree, xml_path, cache_path)
+        if not run:
+            return 0
+        run_coverage(xml_path)
+        return record_coverage(tree, xml_path, cache_path)
+    except Exception:
+        return 0
+
+def calculate_metrics(results_file, chunksize=None, interval=None, coverage=True):
+    """
+    JMeter metrics of `results_file` together with code coverage
+    
+    Args:
+        results_file: Path to the JTL file containing JMeter results
+        chunksize: Rows per chunk when streaming, see jmeter_metrics
+        interval: Seconds per time bucket in the per-interval breakdown
+        coverage: Rerun the test suite under coverage if the cached
+            percentage is stale, instead of reporting 0
+    """
+    metrics = jmeter_metrics(results_file, chunksize, interval)
+    metrics['code_coverage'] = code_coverage(run=coverage)
+    return metrics
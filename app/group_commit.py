@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import logging
+from typing import Dict, List, Optional
+
+from database import place_orders
+
+class GroupCommitter:
+    """
+    Coalesce concurrent ticket orders into shared transactions.
+
+    SQLite serializes writers, so under burst load every reserve/book pays
+    for its own write lock and commit. Orders submitted here are queued and
+    a single worker task applies them together in one transaction, each
+    behind its own savepoint, once `max_batch` orders are waiting or
+    `max_delay` seconds after the first one arrived. Availability is checked
+    by the conditional inventory UPDATE, so later orders in a batch see the
+    seats taken by earlier ones. Every caller gets its own result or error.
+    """
+
+    def __init__(self, session_factory, max_batch: int = 100, max_delay: float = 0.002):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._loop = None
+        self._worker = None
+        self._queue: List[tuple] = []
+        self._closed = False
+        self.batches = 0
+        self.orders = 0
+        self.largest_batch = 0
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Events and futures belong to one event loop
+            self._loop = loop
+            self._queue = []
+            self._full = asyncio.Event()
+            self._worker = None
+            self._closed = False
+
+    async def submit(self, concert_id: int, seat_type: str, quantity: int, ticket_fields: dict) -> Optional[tuple]:
+        """
+        Queue an order and wait for the transaction that applies it.
+
+        Returns:
+            Same as database.place_order, once committed
+        """
+        self._bind_loop()
+        if self._closed:
+            raise RuntimeError("Group committer is closed")
+        future = self._loop.create_future()
+        self._queue.append(((concert_id, seat_type, quantity, ticket_fields), future))
+        if len(self._queue) >= self.max_batch:
+            self._full.set()
+        if self._worker is None or self._worker.done():
+            # Start from an empty context so the batch's queries are not
+            # attributed to the request that happened to start the worker
+            self._worker = contextvars.Context().run(self._loop.create_task, self._run())
+        return await future
+
+    async def _run(self):
+        # Only runs while orders are queued, so an idle committer holds no task
+        while self._queue:
+            if len(self._queue) < self.max_batch and self.max_delay > 0 and not self._closed:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            if len(self._queue) < self.max_batch:
+                self._full.clear()
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[tuple]):
+        try:
+            async with self.session_factory() as db:
+                results = await db.run_sync(place_orders, [order for order, _ in batch])
+                await db.commit()
+        except asyncio.CancelledError:
+            _fail(batch, "Group commit was cancelled at shutdown; the orders may not have been applied")
+            raise
+        except Exception as e:
+            logging.error(f"Group commit of {len(batch)} orders failed: {str(e)}")
+            results = [e] * len(batch)
+
+        self.batches += 1
+        self.orders += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # The caller went away; its order still stands
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self, timeout: float = 5.0):
+        """
+        Stop taking orders and commit the ones already queued.
+
+        Orders still waiting after `timeout` seconds, including a batch cut
+        off mid-transaction, fail with RuntimeError so no caller hangs.
+        """
+        self._closed = True
+        worker = self._worker
+        if worker is not None and not worker.done():
+            self._full.set()  # Skip the max_delay wait
+            try:
+                await asyncio.wait_for(asyncio.shield(worker), timeout)
+            except asyncio.TimeoutError:
+                worker.cancel()
+                try:
+                    await worker
+                except asyncio.CancelledError:
+                    pass
+        queued, self._queue = self._queue, []
+        _fail(queued, "Group committer closed before the order was applied")
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "orders": self.orders,
+            "avg_batch_size": self.orders / self.batches if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "queued": len(self._queue)
+        }
+
+def _fail(batch: List[tuple], message: str):
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(RuntimeError(message))
@@ -0,0 +1,309 @@
+"""
+Load generator for the booking API, writing JMeter-compatible JTL files.
+
+Scenarios are short scripts of requests: browsing the catalogue, the
+reserve -> confirm flow and the book -> cancel flow. They run either
+closed-loop, where a fixed number of virtual users each start their next
+scenario as soon as the last one finishes, or open-loop, where scenarios
+start at a fixed arrival rate however slowly the server answers, so
+queueing shows up as latency instead of lower throughput.
+
+Requests go to a live server with --url, or to the ASGI app in-process
+otherwise. Every request is written as one JTL row, so the results can be
+read by show_metrics.py:
+
+    python load_test.py --users 10 --iterations 5
+    python load_test.py --mode open --rate 50 --duration 60 --url http://localhost:8000
+    python show_metrics.py tests/out/results.jtl
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+
+# Same columns, in the same order, as the JTL files JMeter writes
+JTL_COLUMNS = [
+    'timeStamp', 'elapsed', 'label', 'responseCode', 'responseMessage',
+    'threadName', 'dataType', 'success', 'failureMessage', 'bytes',
+    'sentBytes', 'grpThreads', 'allThreads', 'URL', 'Latency', 'IdleTime',
+    'Connect'
+]
+
+RESULTS_FILE = 'tests/out/results.jtl'
+
+class LoadSession:
+    """
+    HTTP client of one virtual user, recording every request it sends.
+
+    Scenarios call request() and get the httpx response back, or None when
+    the request failed before a response arrived.
+    """
+
+    def __init__(self, client, recorder, thread_name, target):
+        self.client = client
+        self.recorder = recorder
+        self.thread_name = thread_name
+        self.target = target
+
+    async def request(self, label, method, url, **kwargs):
+        request = self.client.build_request(method, url, **kwargs)
+        timestamp = int(time.time() * 1000)
+        start = time.perf_counter()
+        try:
+            response = await self.client.send(request)
+        except httpx.HTTPError as e:
+            elapsed = int((time.perf_counter() - start) * 1000)
+            self.recorder.record(self, timestamp, elapsed, label, request, None, e)
+            return None
+        elapsed = int((time.perf_counter() - start) * 1000)
+        self.recorder.record(self, timestamp, elapsed, label, request, response)
+        return response
+
+class JtlRecorder:
+    """Writes one JTL row per request and tracks how many users are active"""
+
+    def __init__(self, file):
+        self.writer = csv.writer(file)
+        self.writer.writerow(JTL_COLUMNS)
+        self.samples = 0
+        self.errors = 0
+        self.active = 0
+
+    def record(self, session, timestamp, elapsed, label, request, response, error=None):
+        if response is None:
+            # JMeter's wording for requests that never got a response
+            code = f"Non HTTP response code: {type(error).__name__}"
+            message, success, body = str(error), False, b''
+        else:
+            code = response.status_code
+            message, success, body = response.reason_phrase, response.is_success, response.content
+        failure = '' if success else f"{code} {message}"
+        self.writer.writerow([
+            timestamp, elapsed, label, code, message,
+            session.thread_name, 'text', 'true' if success else 'false', failure, len(body),
+            len(request.content), self.active, self.active, str(request.url), elapsed, 0,
+            0
+        ])
+        self.samples += 1
+        self.errors += not success
+
+async def browse_concerts(session):
+    """GET the first page of concerts"""
+    await session.request('Get Concerts', 'GET', '/concerts')
+
+async def reserve_and_confirm(session):
+    """Reserve seats, then confirm the whole reservation"""
+    target = session.target
+    response = await session.request('Reserve Tickets', 'POST', '/tickets/reserve', json={
+        'concert_id': target['concert_id'],
+        'user_id': target['user_id'],
+        'quantity': target['quantity'],
+        'seat_type': target['seat_type']
+    })
+    if response is None or not response.is_success:
+        return
+    reservation_id = response.json()['reservation_details']['reservation_id']
+    await session.request(
+        'Confirm Reservation', 'POST', f'/reservations/{reservation_id}/confirm',
+        params={'user_id': target['user_id']}
+    )
+
+async def book_and_cancel(session):
+    """Book seats, then cancel each booked ticket"""
+    target = session.target
+    response = await session.request('Book Tickets', 'POST', '/tickets/book', json={
+        'concert_id': target['concert_id'],
+        'user_id': target['user_id'],
+        'quantity': target['quantity'],
+        'seat_type': target['seat_type']
+    })
+    if response is None or not response.is_success:
+        return
+    for ticket in response.json():
+        await session.request(
+            'Cancel Ticket', 'POST', f"/tickets/cancel/{ticket['ticket_id']}",
+            params={'user_id': target['user_id']}
+        )
+
+SCENARIOS = {
+    'browse': browse_concerts,
+    'reserve_confirm': reserve_and_confirm,
+    'book_cancel': book_and_cancel
+}
+
+async def run_scenario(scenario, session, recorder):
+    recorder.active += 1
+    try:
+        await scenario(session)
+    finally:
+        recorder.active -= 1
+
+async def run_closed_loop(client, recorder, scenarios, target, users, iterations=None, duration=None, think_time=0):
+    """
+    Each of `users` virtual users runs scenarios back to back.
+
+    Users stop after `iterations` scenarios each, or once `duration`
+    seconds have passed, whichever comes first.
+    """
+    deadline = time.monotonic() + duration if duration else None
+
+    async def user(number):
+        session = LoadSession(client, recorder, f"Load Test Users 1-{number}", target)
+        # Users start at different points of the mix so it stays even
+        mix = itertools.islice(itertools.cycle(scenarios), number - 1, None)
+        for _ in range(iterations) if iterations else itertools.count():
+            if deadline and time.monotonic() >= deadline:
+                break
+            await run_scenario(next(mix), session, recorder)
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    await asyncio.gather(*[user(number) for number in range(1, users + 1)])
+
+async def run_open_loop(client, recorder, scenarios, target, rate, iterations=None, duration=None):
+    """
+    Start a scenario every 1/`rate` seconds, without waiting for earlier ones.
+
+    Arrivals are scheduled from the start time, so a slow loop iteration
+    does not push later arrivals back. Stops after `iterations` arrivals or
+    `duration` seconds, then waits for the scenarios still running.
+    """
+    start = time.monotonic()
+    total = iterations or int(rate * duration)
+    tasks = set()
+    for number in range(total):
+        delay = start + number / rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        session = LoadSession(client, recorder, f"Load Test Arrivals 1-{number + 1}", target)
+        task = asyncio.create_task(run_scenario(scenarios[number % len(scenarios)], session, recorder))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+def seed_target(capacity=100_000):
+    """Create a concert and user to load test against, in the app's own database"""
+    from database import Concert, SessionLocal, UserProfile, init_database
+    init_database()
+    db = SessionLocal()
+    try:
+        concert = Concert(
+            name="Load Test Concert",
+            artist="Load Test Artist",
+            date=datetime.now() + timedelta(days=30),
+            venue="Load Test Venue",
+            genre="Rock",
+            min_price=50.0,
+            capacity=capacity,
+            description="Concert created by load_test.py"
+        )
+        user = UserProfile(email=f"load-test-{uuid.uuid4().hex}@example.com", name="Load Test User")
+        db.add_all([concert, user])
+        db.commit()
+        return {'concert_id': concert.id, 'user_id': user.id}
+    finally:
+        db.close()
+
+async def run_load_test(
+    output=RESULTS_FILE,
+    scenarios=tuple(SCENARIOS),
+    mode='closed',
+    users=10,
+    rate=10.0,
+    iterations=None,
+    duration=None,
+    think_time=0,
+    base_url=None,
+    target=None,
+    lifespan=True
+):
+    """
+    Run a load test and write its samples to `output` as JTL.
+
+    Args:
+        scenarios: Names from SCENARIOS, run in turn
+        mode: 'closed' for `users` looping users, 'open' for `rate` arrivals per second
+        iterations: Scenarios per user (closed) or in total (open)
+        duration: Seconds to run for, when `iterations` is not given
+        base_url: Server to load, or None to call the ASGI app in-process
+        target: concert_id, user_id, seat_type and quantity to book. The
+            in-process app gets a freshly seeded concert and user by default
+        lifespan: Run the in-process app's startup and shutdown handlers
+    Returns:
+        Dictionary with the number of samples and errors written
+    """
+    if not iterations and not duration:
+        raise ValueError("Either iterations or duration is required")
+    target = {'seat_type': 'GENERAL', 'quantity': 1, **(target or {})}
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=None), timeout=30)
+    else:
+        from main import app
+        if 'concert_id' not in target:
+            target.update(seed_target())
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver")
+    scenario_functions = [SCENARIOS[name] for name in scenarios]
+
+    async def run(recorder):
+        if mode == 'open':
+            await run_open_loop(client, recorder, scenario_functions, target, rate, iterations, duration)
+        else:
+            await run_closed_loop(client, recorder, scenario_functions, target, users, iterations, duration, think_time)
+
+    with open(output, 'w', newline='') as f:
+        recorder = JtlRecorder(f)
+        async with client:
+            if base_url or not lifespan:
+                await run(recorder)
+            else:
+                async with app.router.lifespan_context(app):
+                    await run(recorder)
+    return {'samples': recorder.samples, 'errors': recorder.errors}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the booking API and write a JTL file")
+    parser.add_argument("--url", help="server to load test, e.g. http://localhost:8000 (default: the app in-process)")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed",
+                        help="closed: fixed number of looping users, open: fixed arrival rate")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), dest="scenarios",
+                        help="scenario to run, repeat for a mix (default: all)")
+    parser.add_argument("--users", type=int, default=10, help="virtual users in closed mode")
+    parser.add_argument("--rate", type=float, default=10.0, help="scenarios started per second in open mode")
+    parser.add_argument("--iterations", type=int, help="scenarios per user (closed) or in total (open)")
+    parser.add_argument("--duration", type=float, help="seconds to run when --iterations is not given")
+    parser.add_argument("--think-time", type=float, default=0, help="seconds each user waits between scenarios")
+    parser.add_argument("--concert-id", type=int, help="concert to book (default: a new one in-process)")
+    parser.add_argument("--user-id", type=int, help="user booking the tickets (required with --url)")
+    parser.add_argument("--seat-type", default="GENERAL")
+    parser.add_argument("--output", default=RESULTS_FILE, help="JTL file to write")
+    args = parser.parse_args(argv)
+    if not args.iterations and not args.duration:
+        args.iterations = 5
+    if (args.concert_id is None) != (args.user_id is None) or (args.url and args.concert_id is None):
+        parser.error("--concert-id and --user-id go together, and are required with --url")
+
+    target = {'seat_type': args.seat_type}
+    if args.concert_id is not None:
+        target.update(concert_id=args.concert_id, user_id=args.user_id)
+    results = asyncio.run(run_load_test(
+        output=args.output,
+        scenarios=args.scenarios or list(SCENARIOS),
+        mode=args.mode,
+        users=args.users,
+        rate=args.rate,
+        iterations=args.iterations,
+        duration=args.duration,
+        think_time=args.think_time,
+        base_url=args.url,
+        target=target
+    ))
+    print(f"Wrote {results['samples']} samples ({results['errors']} errors) to {args.output}")
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+from datetime import datetime
+from typing import Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Formats tracebacks before records are queued, see StructuredQueueHandler
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+# (request_id, ASGI scope) of the request being handled in the current task
+_request_context: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar(
+    "request_log_context", default=None
+)
+
+# The queue handler installed by the last configure_logging call
+_queue_handler: Optional[logging.Handler] = None
+
+def bind_request(request_id: str, scope: dict) -> contextvars.Token:
+    """Tag log records of the current task with a request id and its route"""
+    return _request_context.set((request_id, scope))
+
+def unbind_request(token: contextvars.Token):
+    _request_context.reset(token)
+
+class RequestContextFilter(logging.Filter):
+    """
+    Copy the request id and route template onto each record.
+
+    Runs on the logging thread, before the record is queued, since the
+    context variable is not visible from the writer thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_context.get()
+        if context is not None:
+            request_id, scope = context
+            record.request_id = request_id
+            # The route is only known once the router has matched it
+            record.route = getattr(scope.get("route"), "path", None)
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a `rate` fraction of records logged with extra={"sample": True}.
+
+    Meant for high-volume success lines; unmarked records and anything at
+    WARNING or above always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or not getattr(record, "sample", False) or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request fields when present"""
+
+    FIELDS = ("request_id", "route", "method", "status", "latency_ms")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Already formatted by StructuredQueueHandler before queueing
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+class DatedFileHandler(logging.FileHandler):
+    """
+    Append to the file named by strftime(`pattern`) for the day of each record.
+
+    A long-running server moves on to the next day's file at midnight
+    instead of writing to the name it started with.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.day = datetime.now().date()
+        super().__init__(self.day.strftime(pattern), delay=True)
+
+    def emit(self, record: logging.LogRecord):
+        day = datetime.fromtimestamp(record.created).date()
+        if day > self.day:
+            self.day = day
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(day.strftime(self.pattern))
+        super().emit(record)
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the traceback apart from the message.
+
+    The stock prepare() merges the formatted exception into `msg` and drops
+    exc_info, so the writer's formatter can no longer tell them apart. Here
+    the traceback travels as exc_text, which formatters print after the
+    message as usual and JsonFormatter writes as its own field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A copy, so handlers after this one still see the original record
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+def create_file_handler(filename: str, max_bytes: int = 0, when: str = "", backup_count: int = 7) -> logging.Handler:
+    """
+    Plain, size-rotated or time-rotated file handler for the log writer thread
+
+    A `filename` with strftime fields such as %d_%m_%Y names a new file
+    each day, unless size or time rotation is set, which keep today's name.
+    """
+    if max_bytes > 0:
+        return logging.handlers.RotatingFileHandler(datetime.now().strftime(filename), maxBytes=max_bytes, backupCount=backup_count)
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(datetime.now().strftime(filename), when=when, backupCount=backup_count)
+    if "%" in filename:
+        return DatedFileHandler(filename)
+    return logging.FileHandler(filename)
+
+def configure_logging(
+    filename: str,
+    level: int = logging.INFO,
+    json_format: bool = False,
+    max_bytes: int = 0,
+    when: str = "",
+    backup_count: int = 7,
+    sample_rate: float = 1.0
+) -> logging.handlers.QueueListener:
+    """
+    Send the root logger's records through a queue to a background writer.
+
+    Logging calls only enqueue the record, so request handlers never wait
+    on the disk. The QueueListener's thread formats and writes the records;
+    call stop() on it at shutdown to flush what is still queued.
+
+    Returns:
+        QueueListener: The started listener
+    """
+    global _queue_handler
+    file_handler = create_file_handler(filename, max_bytes, when, backup_count)
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    _queue_handler = queue_handler
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,17 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import select, and_, desc
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, desc, func, tuple_
 from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
 import logging
+import os
+import uuid
 from typing import List, Optional
-from pydantic import BaseModel
-from database import get_db, Concert, Ticket, UserProfile, init_database
+from pydantic import BaseModel, Field
+from cache import CachedResponse, CatalogueCache, create_availability_cache
+from group_commit import GroupCommitter
+from logging_config import configure_logging
+from database import engine, async_engine, get_async_db, AsyncSessionLocal, Concert, Ticket, UserProfile, init_database, get_inventory, get_inventories, adjust_inventory, place_order, place_orders, transition_ticket, transition_reservation, expire_reservations, get_catalogue_version
 
 # Data Models for Request/Response
 class TicketRequest(BaseModel):
     concert_id: int
     user_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
     seat_type: str  # 'VIP', 'GENERAL', 'BACKSTAGE'
 
 class TicketResponse(BaseModel):
@@ -23,29 +33,123 @@ class TicketResponse(BaseModel):
     seat_type: str
     booking_time: datetime
 
+# Largest number of lines accepted by /tickets/book/batch
+BATCH_BOOKING_MAX_LINES = int(os.getenv("BATCH_BOOKING_MAX_LINES", "100"))
+
+class BatchBookingRequest(BaseModel):
+    lines: List[TicketRequest] = Field(min_length=1, max_length=BATCH_BOOKING_MAX_LINES)
+    # False books every line that can be booked and reports the rest
+    all_or_nothing: bool = True
+
+async def track_in_flight(request: Request):
+    """Count a request as in flight on its route template while it is handled"""
+    route = request.scope["route"].path
+    service_monitor.request_started(route, request.method)
+    try:
+        yield
+    finally:
+        service_monitor.request_finished(route, request.method)
+
 # Initialize FastAPI app
-app = FastAPI()
-
-# Configure logging
-log_filename = f"concert_booking_{datetime.now().strftime('%d_%m_%Y')}.log"
-logging.basicConfig(
-    filename=log_filename,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+app = FastAPI(dependencies=[Depends(track_in_flight)])
+
+# Configure logging. Records are written by a background thread, so
+# handlers never wait on the disk. LOG_FORMAT=json writes JSON lines with the
+# request id and route; LOG_SUCCESS_SAMPLE_RATE keeps a fraction of the
+# high-volume success lines. The file name moves to the next day at midnight
+log_filename = "concert_booking_%d_%m_%Y.log"
+log_listener = configure_logging(
+    log_filename,
+    level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper()),
+    json_format=os.getenv("LOG_FORMAT", "text") == "json",
+    max_bytes=int(os.getenv("LOG_MAX_BYTES", "0")),
+    when=os.getenv("LOG_ROTATE_WHEN", ""),
+    backup_count=int(os.getenv("LOG_BACKUP_COUNT", "7")),
+    sample_rate=float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1"))
 )
 
-# Cache for concert availability
-availability_cache = {}
+# Cache for concert availability. Use the "sqlite" backend with
+# `uvicorn --workers N` so invalidations reach every worker process.
 CACHE_DURATION = timedelta(minutes=5)
+availability_cache = create_availability_cache(
+    backend=os.getenv("AVAILABILITY_CACHE_BACKEND", "memory"),
+    ttl=CACHE_DURATION.total_seconds(),
+    path=os.getenv("AVAILABILITY_CACHE_PATH", "availability_cache.db"),
+    max_entries=int(os.getenv("AVAILABILITY_CACHE_MAX_ENTRIES", "10000"))
+)
+
+# Serialized /concerts pages, invalidated when the catalogue version changes
+CATALOGUE_CACHE_TTL = float(os.getenv("CATALOGUE_CACHE_TTL", "30"))  # seconds
+CATALOGUE_CACHE_MAX_AGE = int(os.getenv("CATALOGUE_CACHE_MAX_AGE", "5"))  # seconds clients may reuse a page
+catalogue_cache = CatalogueCache(ttl=CATALOGUE_CACHE_TTL)
+
+# Background expiry of abandoned reservations. Small batches keep each
+# sweep transaction short so it never holds the SQLite write lock for long.
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))  # seconds, 0 disables
+RESERVATION_SWEEP_BATCH_SIZE = int(os.getenv("RESERVATION_SWEEP_BATCH_SIZE", "500"))
+reservation_sweeper_stats = {
+    "last_run": None,
+    "last_reclaimed": 0,
+    "total_reclaimed": 0
+}
+reservation_sweeper_task = None
+
+# Group commit for reserve/book: concurrent orders share one transaction,
+# flushed after GROUP_COMMIT_MAX_DELAY_MS or once GROUP_COMMIT_MAX_BATCH are queued
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT", "1") == "1"
+group_committer = GroupCommitter(
+    AsyncSessionLocal,
+    max_batch=int(os.getenv("GROUP_COMMIT_MAX_BATCH", "100")),
+    max_delay=float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "2")) / 1000
+)
 
 # Initialize monitoring
-from monitoring import ServiceMonitor
+from monitoring import ServiceMonitor, TimingMiddleware
+from query_monitor import QueryMonitor
 service_monitor = ServiceMonitor()
 
+# SQL query counts and timings per request, with the slow-query log and
+# duplicate detection. The cursor hooks cost more per request than the rest
+# of the middleware, so they are off unless QUERY_MONITOR=1; DEBUG=1 turns
+# them on and also returns them as X-DB-Query-* response headers
+DEBUG = os.getenv("DEBUG", "0") == "1"
+query_monitor = None
+if DEBUG or os.getenv("QUERY_MONITOR", "0") == "1":
+    query_monitor = QueryMonitor(
+        slow_query_threshold=float(os.getenv("SLOW_QUERY_MS", "100")) / 1000,
+        duplicate_threshold=int(os.getenv("DUPLICATE_QUERY_THRESHOLD", "3"))
+    )
+    query_monitor.instrument(engine)
+    query_monitor.instrument(async_engine.sync_engine)
+    service_monitor.register_query_monitor(query_monitor)
+app.add_middleware(
+    TimingMiddleware,
+    monitor=service_monitor,
+    query_monitor=query_monitor,
+    debug_headers=DEBUG,
+    access_log=os.getenv("ACCESS_LOG", "0") == "1"
+)
+service_monitor.register_cache("availability", availability_cache)
+service_monitor.register_pool("database", engine)
+service_monitor.register_pool("database_async", async_engine)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and required tables on startup"""
+    global reservation_sweeper_task
     init_database()
+    if RESERVATION_SWEEP_INTERVAL > 0:
+        reservation_sweeper_task = asyncio.create_task(run_reservation_sweeper())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the background reservation sweeper, close pooled connections and flush the log"""
+    if reservation_sweeper_task:
+        reservation_sweeper_task.cancel()
+    await group_committer.close()
+    await async_engine.dispose()
+    engine.dispose()
+    log_listener.stop()
 
 @app.get("/")
 async def root():
@@ -56,20 +160,35 @@ async def root():
         "endpoints": [
             "/concerts",
             "/tickets/book",
+            "/tickets/book/batch",
             "/tickets/cancel",
-            "/health"
+            "/reservations/{reservation_id}/confirm",
+            "/reservations/{reservation_id}/cancel",
+            "/health",
+            "/metrics"
         ]
     }
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint with monitoring metrics"""
-    metrics = service_monitor.get_metrics()
+    # Reads the availability cache's stats
+    metrics = await call_availability_cache(service_monitor.get_metrics)
     return {
         "status": "healthy",
-        "metrics": metrics
+        "metrics": metrics,
+        "reservation_sweeper": reservation_sweeper_stats,
+        "group_commit": group_committer.stats() if GROUP_COMMIT_ENABLED else None
     }
     
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, cache and connection pool metrics in Prometheus text format"""
+    return PlainTextResponse(
+        await call_availability_cache(service_monitor.render_prometheus),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+    
 # Add these new status constants to your existing code
 TICKET_STATUS = {
     "RESERVED": "RESERVED",      # Initial temporary hold
@@ -82,23 +201,21 @@ TICKET_STATUS = {
 class ReservationRequest(BaseModel):
     concert_id: int
     user_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
     seat_type: str
 
 @app.post("/tickets/reserve")
 async def reserve_ticket(
     reservation_request: ReservationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Reserve tickets for a concert with a temporary hold.
     Reservations expire after 15 minutes if not confirmed.
     """
     try:
-        start_time = datetime.now()
-        
         # Check concert existence and availability
-        concert = db.query(Concert).filter(Concert.id == reservation_request.concert_id).first()
+        concert = await db.get(Concert, reservation_request.concert_id)
         if not concert:
             raise HTTPException(status_code=404, detail="Concert not found")
             
@@ -107,55 +224,47 @@ async def reserve_ticket(
             raise HTTPException(status_code=400, detail="Concert has already taken place")
             
         # Check ticket availability
-        available_tickets = get_available_tickets(
+        available_tickets = await get_available_tickets(
             db,
             concert.id,
             reservation_request.seat_type
         )
         
-        if available_tickets < reservation_request.quantity:
+        # Create temporary reservation records with one bulk insert
+        reservation_expiry = datetime.now() + timedelta(minutes=15)
+        ticket_fields = {
+            "concert_id": concert.id,
+            "user_id": reservation_request.user_id,
+            "status": "RESERVED",
+            "amount": get_ticket_price(concert, reservation_request.seat_type),
+            "seat_type": reservation_request.seat_type,
+            "booking_time": datetime.now(),
+            "reservation_expiry": reservation_expiry,
+            "reservation_id": uuid.uuid4().hex
+        }
+        ticket_ids = None
+        if available_tickets >= reservation_request.quantity:
+            ticket_ids = await place_ticket_order(
+                db,
+                reservation_request.quantity,
+                ticket_fields
+            )
+        if ticket_ids is None:
             raise HTTPException(
                 status_code=400,
                 detail="Not enough tickets available"
             )
-            
-        # Create temporary reservation records
-        tickets = []
-        reservation_expiry = datetime.now() + timedelta(minutes=15)
-        
-        for _ in range(reservation_request.quantity):
-            ticket = Ticket(
-                concert_id=concert.id,
-                user_id=reservation_request.user_id,
-                seat_type=reservation_request.seat_type,
-                status="RESERVED",
-                amount=get_ticket_price(concert, reservation_request.seat_type),
-                booking_time=datetime.now(),
-                reservation_expiry=reservation_expiry
-            )
-            db.add(ticket)
-            tickets.append(ticket)
-            
-        db.commit()
         
         # Transform tickets to response format
         ticket_responses = [
-            {
-                "ticket_id": t.id,
-                "concert_id": t.concert_id,
-                "user_id": t.user_id,
-                "status": t.status,
-                "amount": t.amount,
-                "seat_type": t.seat_type,
-                "booking_time": t.booking_time,
-                "reservation_expiry": t.reservation_expiry
-            }
-            for t in tickets
+            {"ticket_id": ticket_id, **ticket_fields}
+            for ticket_id in ticket_ids
         ]
         
         return {
             "message": "Tickets reserved successfully",
             "reservation_details": {
+                "reservation_id": ticket_fields["reservation_id"],
                 "tickets": ticket_responses,
                 "expires_at": reservation_expiry,
                 "payment_required_by": reservation_expiry.isoformat()
@@ -165,31 +274,29 @@ async def reserve_ticket(
     except HTTPException as he:
         raise he
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f"Error reserving tickets: {str(e)}")
         raise HTTPException(status_code=500, detail="Error reserving tickets")
     finally:
-        db.close()
+        await db.close()
 
 @app.post("/tickets/confirm/{ticket_id}")
 async def confirm_ticket(
     ticket_id: int,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Confirm a reserved ticket by completing the payment.
     Must be done before reservation expires.
     """
     try:
-        start_time = datetime.now()
-        
         # Get ticket reservation
-        ticket = db.query(Ticket).filter(
+        ticket = await db.scalar(select(Ticket).where(
             Ticket.id == ticket_id,
             Ticket.user_id == user_id,
             Ticket.status == TICKET_STATUS["RESERVED"]
-        ).first()
+        ))
         
         if not ticket:
             raise HTTPException(
@@ -199,27 +306,43 @@ async def confirm_ticket(
             
         # Check if reservation has expired
         if datetime.now() > ticket.reservation_expiry:
-            ticket.status = TICKET_STATUS["EXPIRED"]
-            db.commit()
+            # The sweeper may have expired it already; only one of us releases the seat
+            if await db.run_sync(
+                transition_ticket, ticket_id, user_id,
+                TICKET_STATUS["RESERVED"], TICKET_STATUS["EXPIRED"]
+            ):
+                inventory = await db.run_sync(
+                    adjust_inventory, ticket.concert_id, ticket.seat_type, 1,
+                    from_status=TICKET_STATUS["RESERVED"],
+                    to_status=TICKET_STATUS["EXPIRED"],
+                    tickets_updated=True
+                )
+                await db.commit()
+                await update_availability_cache(ticket.concert_id, ticket.seat_type, inventory)
             raise HTTPException(
                 status_code=400,
                 detail="Ticket reservation has expired"
             )
             
-        # Update ticket status to confirmed
-        ticket.status = TICKET_STATUS["CONFIRMED"]
-        db.commit()
-        
-        # Clear availability cache
-        clear_availability_cache(ticket.concert_id)
-        
-        # Update monitoring
-        service_monitor.record_request(
-            duration=(datetime.now() - start_time).total_seconds(),
-            success=True
+        # Update ticket status to confirmed unless a concurrent request moved it
+        if not await db.run_sync(
+            transition_ticket, ticket_id, user_id,
+            TICKET_STATUS["RESERVED"], TICKET_STATUS["CONFIRMED"]
+        ):
+            raise HTTPException(
+                status_code=409,
+                detail="Ticket was changed by another request"
+            )
+        inventory = await db.run_sync(
+            adjust_inventory, ticket.concert_id, ticket.seat_type, 1,
+            from_status=TICKET_STATUS["RESERVED"],
+            to_status=TICKET_STATUS["CONFIRMED"],
+            tickets_updated=True
         )
+        await db.commit()
+        await update_availability_cache(ticket.concert_id, ticket.seat_type, inventory)
         
-        logging.info(f"Successfully confirmed ticket {ticket_id}")
+        logging.info(f"Successfully confirmed ticket {ticket_id}", extra={"sample": True})
         return {
             "message": "Ticket confirmed successfully",
             "ticket": ticket
@@ -228,73 +351,260 @@ async def confirm_ticket(
     except HTTPException as he:
         raise he
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f"Error confirming ticket: {str(e)}")
-        service_monitor.record_request(
-            duration=(datetime.now() - start_time).total_seconds(),
-            success=False
-        )
         raise HTTPException(status_code=500, detail="Error confirming ticket")
     finally:
-        db.close()
+        await db.close()
+
+@app.post("/reservations/{reservation_id}/confirm")
+async def confirm_reservation(
+    reservation_id: str,
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Confirm every reserved ticket of a reservation with one UPDATE.
+    The expiry is checked once for the whole group.
+    """
+    try:
+        # All tickets of a reservation share the same hold
+        reserved_count, expiry = (await db.execute(
+            select(func.count(Ticket.id), func.min(Ticket.reservation_expiry)).where(
+                Ticket.reservation_id == reservation_id,
+                Ticket.user_id == user_id,
+                Ticket.status == TICKET_STATUS["RESERVED"]
+            )
+        )).one()
+        
+        if not reserved_count:
+            raise HTTPException(
+                status_code=404,
+                detail="Reservation not found or unauthorized"
+            )
+            
+        # Check if reservation has expired
+        if expiry is not None and datetime.now() > expiry:
+            _, changes = await db.run_sync(
+                transition_reservation, reservation_id, user_id,
+                TICKET_STATUS["RESERVED"], TICKET_STATUS["EXPIRED"]
+            )
+            await db.commit()
+            await update_group_availability(changes)
+            raise HTTPException(
+                status_code=400,
+                detail="Reservation has expired"
+            )
+            
+        # Tickets moved by a concurrent request are left out of the UPDATE
+        ticket_ids, changes = await db.run_sync(
+            transition_reservation, reservation_id, user_id,
+            TICKET_STATUS["RESERVED"], TICKET_STATUS["CONFIRMED"]
+        )
+        if not ticket_ids:
+            raise HTTPException(
+                status_code=409,
+                detail="Reservation was changed by another request"
+            )
+        await db.commit()
+        await update_group_availability(changes)
+        
+        logging.info(f"Successfully confirmed {len(ticket_ids)} tickets of reservation {reservation_id}", extra={"sample": True})
+        return {
+            "message": "Reservation confirmed successfully",
+            "reservation_id": reservation_id,
+            "ticket_ids": ticket_ids
+        }
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        await db.rollback()
+        logging.error(f"Error confirming reservation: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error confirming reservation")
+    finally:
+        await db.close()
+
+@app.post("/reservations/{reservation_id}/cancel")
+async def cancel_reservation(
+    reservation_id: str,
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Cancel every reserved or confirmed ticket of a reservation, releasing
+    their seats with one UPDATE per status.
+    """
+    try:
+        concert_id = await db.scalar(
+            select(Ticket.concert_id).where(
+                Ticket.reservation_id == reservation_id,
+                Ticket.user_id == user_id,
+                Ticket.status.in_([TICKET_STATUS["RESERVED"], TICKET_STATUS["CONFIRMED"]])
+            ).limit(1)
+        )
+        
+        if concert_id is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Reservation not found or unauthorized"
+            )
+            
+        # Check if concert is within cancellation window
+        concert = await db.get(Concert, concert_id)
+        if concert.date - datetime.now() < timedelta(hours=24):
+            raise HTTPException(
+                status_code=400,
+                detail="Cannot cancel tickets less than 24 hours before concert"
+            )
+            
+        ticket_ids = []
+        changes = {}
+        for from_status in (TICKET_STATUS["RESERVED"], TICKET_STATUS["CONFIRMED"]):
+            moved_ids, moved = await db.run_sync(
+                transition_reservation, reservation_id, user_id,
+                from_status, TICKET_STATUS["CANCELLED"]
+            )
+            ticket_ids += moved_ids
+            # The later change of a seat type carries the newer version
+            changes.update(moved)
+        if not ticket_ids:
+            raise HTTPException(
+                status_code=409,
+                detail="Reservation was changed by another request"
+            )
+        await db.commit()
+        await update_group_availability(changes)
+        
+        logging.info(f"Successfully cancelled {len(ticket_ids)} tickets of reservation {reservation_id}", extra={"sample": True})
+        return {
+            "message": "Reservation cancelled successfully",
+            "reservation_id": reservation_id,
+            "ticket_ids": ticket_ids
+        }
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        await db.rollback()
+        logging.error(f"Error cancelling reservation: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error cancelling reservation")
+    finally:
+        await db.close()
 
-# Add this to your existing Ticket model in database.py
 
 @app.get("/concerts")
 async def get_concerts(
+    request: Request,
     skip: int = 0,
     limit: int = 10,
     genre: Optional[str] = None,
     min_price: Optional[float] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get available concerts with optional filtering
+    Get available concerts with optional filtering.
+
+    Concerts are ordered by (date, id). Passing `cursor` (empty for the first
+    page) switches to keyset pagination: the response becomes
+    {"concerts": [...], "next_cursor": ...} and each page costs the same no
+    matter how deep it is. `skip` remains as an offset fallback.
+
+    Serialized pages are cached per catalogue version and carry an ETag, so
+    a request with a matching If-None-Match gets an empty 304.
     """
     try:
-        start_time = datetime.now()
+        # Read the version before the concerts so a page is never cached
+        # under a newer version than the data it holds
+        catalogue_version = await db.run_sync(get_catalogue_version)
+        cache_key = (skip, limit, genre, min_price, cursor)
+        page = catalogue_cache.get(catalogue_version, cache_key) if catalogue_version else None
         
-        # Build query with filters
-        query = db.query(Concert).filter(Concert.date >= datetime.now())
+        if page is None:
+            payload = await query_concerts(db, skip, limit, genre, min_price, cursor)
+            item_count = len(payload if cursor is None else payload["concerts"])
+            if catalogue_version:
+                page = catalogue_cache.put(catalogue_version, cache_key, payload, item_count)
+            else:
+                page = CachedResponse(payload, item_count, expires_at=0)
         
-        if genre:
-            query = query.filter(Concert.genre == genre)
-        if min_price is not None:
-            query = query.filter(Concert.min_price >= min_price)
-            
-        # Apply pagination
-        concerts = query.offset(skip).limit(limit).all()
-        
-        # Update monitoring
-        service_monitor.record_request(
-            duration=(datetime.now() - start_time).total_seconds(),
-            success=True
-        )
-        
-        logging.info(f"Successfully retrieved {len(concerts)} concerts")
-        return concerts
+        logging.info(f"Successfully retrieved {page.item_count} concerts", extra={"sample": True})
+        headers = {
+            "ETag": page.etag,
+            "Cache-Control": f"public, max-age={CATALOGUE_CACHE_MAX_AGE}"
+        }
+        if page.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=page.body, media_type="application/json", headers=headers)
         
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logging.error(f"Error retrieving concerts: {str(e)}")
-        service_monitor.record_request(
-            duration=(datetime.now() - start_time).total_seconds(),
-            success=False
-        )
         raise HTTPException(status_code=500, detail="Error retrieving concerts")
 
+async def query_concerts(
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    genre: Optional[str],
+    min_price: Optional[float],
+    cursor: Optional[str]
+):
+    """Run the catalogue query for get_concerts and build its response payload"""
+    # Build query with filters
+    now = datetime.now()
+    position = decode_concert_cursor(cursor) if cursor else None
+    if position and position[0] >= now:
+        # Keep a single lower bound on date so the index seeks straight to the page
+        query = select(Concert).where(tuple_(Concert.date, Concert.id) > position)
+    else:
+        query = select(Concert).where(Concert.date >= now)
+        if position:
+            query = query.where(tuple_(Concert.date, Concert.id) > position)
+    
+    if genre:
+        query = query.where(Concert.genre == genre)
+    if min_price is not None:
+        query = query.where(Concert.min_price >= min_price)
+    
+    # Ordering matches the date index, which also carries the id
+    query = query.order_by(Concert.date, Concert.id)
+        
+    # Apply pagination
+    if cursor is None:
+        return (await db.scalars(query.offset(skip).limit(limit))).all()
+    
+    # One extra row tells whether another page follows
+    concerts = (await db.scalars(query.limit(limit + 1))).all()
+    next_cursor = encode_concert_cursor(concerts[limit - 1]) if len(concerts) > limit else None
+    return {"concerts": concerts[:limit], "next_cursor": next_cursor}
+
+def encode_concert_cursor(concert: Concert) -> str:
+    """Opaque cursor pointing just after `concert` in (date, id) order"""
+    position = json.dumps([concert.date.isoformat(), concert.id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_concert_cursor(cursor: str) -> tuple:
+    """Turn a cursor from encode_concert_cursor back into a (date, id) key"""
+    try:
+        date, concert_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(date), int(concert_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.post("/tickets/book")
 async def book_ticket(
     ticket_request: TicketRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Book tickets for a concert
     """
     try:
-        start_time = datetime.now()
-        
         # Check concert existence and availability
-        concert = db.query(Concert).filter(Concert.id == ticket_request.concert_id).first()
+        concert = await db.get(Concert, ticket_request.concert_id)
         if not concert:
             raise HTTPException(status_code=404, detail="Concert not found")
             
@@ -303,70 +613,175 @@ async def book_ticket(
             raise HTTPException(status_code=400, detail="Concert has already taken place")
             
         # Check ticket availability
-        available_tickets = get_available_tickets(
+        available_tickets = await get_available_tickets(
             db,
             concert.id,
             ticket_request.seat_type
         )
         
-        if available_tickets < ticket_request.quantity:
+        # Create ticket records with one bulk insert
+        ticket_fields = {
+            "concert_id": concert.id,
+            "user_id": ticket_request.user_id,
+            "status": "RESERVED",
+            "amount": get_ticket_price(concert, ticket_request.seat_type),
+            "seat_type": ticket_request.seat_type,
+            "booking_time": datetime.now(),
+            "reservation_id": uuid.uuid4().hex
+        }
+        ticket_ids = None
+        if available_tickets >= ticket_request.quantity:
+            ticket_ids = await place_ticket_order(
+                db,
+                ticket_request.quantity,
+                ticket_fields
+            )
+        if ticket_ids is None:
             raise HTTPException(
                 status_code=400,
                 detail="Not enough tickets available"
             )
-            
-        # Create ticket records
-        tickets = []
-        for _ in range(ticket_request.quantity):
-            ticket = Ticket(
-                concert_id=concert.id,
-                user_id=ticket_request.user_id,
-                seat_type=ticket_request.seat_type,
-                status="RESERVED",
-                amount=get_ticket_price(concert, ticket_request.seat_type),
-                booking_time=datetime.now()
-            )
-            db.add(ticket)
-            tickets.append(ticket)
-            
-        db.commit()
         
         ticket_responses = [
-            {
-                "ticket_id": t.id,
-                "concert_id": t.concert_id,
-                "user_id": t.user_id,
-                "status": t.status,
-                "amount": t.amount,
-                "seat_type": t.seat_type,
-                "booking_time": t.booking_time
-            }
-            for t in tickets
+            {"ticket_id": ticket_id, **ticket_fields}
+            for ticket_id in ticket_ids
         ]
         
         return ticket_responses
         
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+        await db.rollback()
+        logging.error(f"Error booking tickets: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error booking tickets")
+
+@app.post("/tickets/book/batch")
+async def book_tickets_batch(
+    batch_request: BatchBookingRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Book several lines, possibly for different concerts, in one request.
+
+    Concerts and inventory rows for every line are loaded with one query
+    each, and all tickets are inserted in a single transaction. With
+    `all_or_nothing` any failing line rejects the whole batch with a 400;
+    otherwise the lines that can be booked are, and each line reports its
+    own result.
+    """
+    try:
+        lines = batch_request.lines
+        concerts = {
+            concert.id: concert
+            for concert in await db.scalars(
+                select(Concert).where(Concert.id.in_({line.concert_id for line in lines}))
+            )
+        }
+        inventories = await db.run_sync(get_inventories, {
+            (line.concert_id, line.seat_type)
+            for line in lines
+            if line.concert_id in concerts
+        })
+        
+        # Lines for the same seat type draw from one shared count
+        remaining = {key: inventory.available for key, inventory in inventories.items()}
+        now = datetime.now()
+        errors = {}
+        orders = {}
+        for index, line in enumerate(lines):
+            concert = concerts.get(line.concert_id)
+            key = (line.concert_id, line.seat_type)
+            if concert is None:
+                errors[index] = "Concert not found"
+            elif concert.date < now:
+                errors[index] = "Concert has already taken place"
+            elif remaining.get(key, 0) < line.quantity:
+                errors[index] = "Not enough tickets available"
+            else:
+                remaining[key] -= line.quantity
+                orders[index] = (line.concert_id, line.seat_type, line.quantity, {
+                    "concert_id": concert.id,
+                    "user_id": line.user_id,
+                    "status": "RESERVED",
+                    "amount": get_ticket_price(concert, line.seat_type),
+                    "seat_type": line.seat_type,
+                    "booking_time": now,
+                    "reservation_id": uuid.uuid4().hex
+                })
+        
+        if errors and batch_request.all_or_nothing:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail={
+                "message": "No tickets were booked",
+                "results": batch_results(lines, errors, {})
+            })
+        
+        placed = await db.run_sync(place_orders, list(orders.values()), batch_request.all_or_nothing)
+        if placed is None:
+            # A concurrent request took the seats after they were checked
+            await db.rollback()
+            raise HTTPException(status_code=400, detail={
+                "message": "No tickets were booked",
+                "results": batch_results(lines, {index: "Not enough tickets available" for index in orders}, {})
+            })
+        await db.commit()
+        
+        booked = {}
+        for (index, order), result in zip(orders.items(), placed):
+            if isinstance(result, Exception):
+                logging.error(f"Error booking batch line {index}: {str(result)}")
+                errors[index] = "Error booking tickets"
+            elif result is None:
+                errors[index] = "Not enough tickets available"
+            else:
+                ticket_ids, inventory = result
+                await update_availability_cache(order[0], order[1], inventory)
+                booked[index] = [
+                    {"ticket_id": ticket_id, **order[3]}
+                    for ticket_id in ticket_ids
+                ]
+        
+        logging.info(f"Batch booking placed {len(booked)} of {len(lines)} lines", extra={"sample": True})
+        return {
+            "message": "Tickets booked successfully" if not errors else "Some lines could not be booked",
+            "results": batch_results(lines, errors, booked)
+        }
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        await db.rollback()
+        logging.error(f"Error booking ticket batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error booking tickets")
+
+def batch_results(lines: List[TicketRequest], errors: dict, booked: dict) -> list:
+    """Per-line outcome of a batch booking, in request order"""
+    results = []
+    for index, line in enumerate(lines):
+        result = {"line": index, "concert_id": line.concert_id, "seat_type": line.seat_type}
+        if index in booked:
+            result.update(status="BOOKED", tickets=booked[index])
+        else:
+            result.update(status="FAILED", error=errors.get(index, "Not booked"))
+        results.append(result)
+    return results
 
 @app.post("/tickets/cancel/{ticket_id}")
 async def cancel_ticket(
     ticket_id: int,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cancel a booked ticket
     """
     try:
-        start_time = datetime.now()
-        
         # Get ticket
-        ticket = db.query(Ticket).filter(
+        ticket = await db.scalar(select(Ticket).where(
             Ticket.id == ticket_id,
             Ticket.user_id == user_id
-        ).first()
+        ))
         
         if not ticket:
             raise HTTPException(
@@ -375,69 +790,69 @@ async def cancel_ticket(
             )
             
         # Check if concert is within cancellation window
-        concert = db.query(Concert).filter(Concert.id == ticket.concert_id).first()
+        concert = await db.get(Concert, ticket.concert_id)
         if concert.date - datetime.now() < timedelta(hours=24):
             raise HTTPException(
                 status_code=400,
                 detail="Cannot cancel tickets less than 24 hours before concert"
             )
             
-        # Update ticket status
-        ticket.status = "CANCELLED"
-        db.commit()
-        
-        # Clear availability cache
-        clear_availability_cache(concert.id)
-        
-        # Update monitoring
-        service_monitor.record_request(
-            duration=(datetime.now() - start_time).total_seconds(),
-            success=True
+        if ticket.status in (TICKET_STATUS["CANCELLED"], TICKET_STATUS["EXPIRED"]):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Ticket is already {ticket.status.lower()}"
+            )
+            
+        # Update ticket status and release the seat it held, unless a
+        # concurrent request or the sweeper moved it first
+        from_status = ticket.status
+        if not await db.run_sync(
+            transition_ticket, ticket_id, user_id,
+            from_status, TICKET_STATUS["CANCELLED"]
+        ):
+            raise HTTPException(
+                status_code=409,
+                detail="Ticket was changed by another request"
+            )
+        inventory = await db.run_sync(
+            adjust_inventory, concert.id, ticket.seat_type, 1,
+            from_status=from_status,
+            to_status=TICKET_STATUS["CANCELLED"],
+            tickets_updated=True
         )
+        await db.commit()
+        await update_availability_cache(concert.id, ticket.seat_type, inventory)
         
-        logging.info(f"Successfully cancelled ticket {ticket_id}")
+        logging.info(f"Successfully cancelled ticket {ticket_id}", extra={"sample": True})
         return {"message": "Ticket cancelled successfully"}
         
     except HTTPException as he:
         raise he
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logging.error(f"Error cancelling ticket: {str(e)}")
-        service_monitor.record_request(
-            duration=(datetime.now() - start_time).total_seconds(),
-            success=False
-        )
         raise HTTPException(status_code=500, detail="Error cancelling ticket")
     finally:
-        db.close()
+        await db.close()
 
-def get_available_tickets(db: Session, concert_id: int, seat_type: str) -> int:
+async def get_available_tickets(db: AsyncSession, concert_id: int, seat_type: str) -> int:
     """Calculate available tickets for a concert and seat type"""
-    cache_key = f"concert_{concert_id}_{seat_type}"
-    
     # Check cache
-    if cache_key in availability_cache:
-        cache_time, count = availability_cache[cache_key]
-        if datetime.now() - cache_time < CACHE_DURATION:
-            return count
-            
-    # Query database
-    total_tickets = db.query(Concert).filter(
-        Concert.id == concert_id
-    ).first().capacity
-    
-    booked_tickets = db.query(Ticket).filter(
-        and_(
-            Ticket.concert_id == concert_id,
-            Ticket.seat_type == seat_type,
-            Ticket.status.in_(["RESERVED", "CONFIRMED"])
-        )
-    ).count()
+    count = await call_availability_cache(availability_cache.get, concert_id, seat_type)
+    if count is not None:
+        return count
     
-    available = total_tickets - booked_tickets
+    # Taken before the read so a concurrent invalidation discards this count
+    stamp = await call_availability_cache(availability_cache.stamp, concert_id)
+            
+    # Single primary-key read on the inventory counters
+    inventory = await db.run_sync(get_inventory, concert_id, seat_type)
+    available = inventory.available
     
-    # Update cache
-    availability_cache[cache_key] = (datetime.now(), available)
+    # Update cache, unless a write-through already stored a newer version
+    await call_availability_cache(
+        availability_cache.set, concert_id, seat_type, available, stamp, version=inventory.version
+    )
     
     return available
 
@@ -451,11 +866,102 @@ def get_ticket_price(concert: Concert, seat_type: str) -> float:
     }
     return base_price * multipliers.get(seat_type, 1.0)
 
-def clear_availability_cache(concert_id: int):
-    """Clear cache entries for a specific concert"""
-    keys_to_remove = [
-        key for key in availability_cache.keys()
-        if key.startswith(f"concert_{concert_id}")
-    ]
-    for key in keys_to_remove:
-        availability_cache.pop(key, None)
\ No newline at end of file
+async def place_ticket_order(db: AsyncSession, quantity: int, ticket_fields: dict) -> Optional[list]:
+    """
+    Hold seats and insert the order's tickets, then write the new
+    availability through to the cache.
+
+    With group commit enabled the order joins the next shared transaction;
+    otherwise it commits on the request's own session.
+
+    Returns:
+        list: The new ticket ids, or None if there are not enough seats
+    """
+    order = (ticket_fields["concert_id"], ticket_fields["seat_type"], quantity, ticket_fields)
+    if GROUP_COMMIT_ENABLED:
+        # Release any write lock this request holds, e.g. from backfilling
+        # the inventory row, before waiting on the shared transaction
+        await db.commit()
+        result = await group_committer.submit(*order)
+    else:
+        result = await db.run_sync(place_order, *order)
+        if result is not None:
+            await db.commit()
+    if result is None:
+        return None
+    ticket_ids, inventory = result
+    await update_availability_cache(order[0], order[1], inventory)
+    return ticket_ids
+
+async def call_availability_cache(function, *args, **kwargs):
+    """
+    Call the availability cache without blocking the event loop.
+
+    The SQLite backend can wait up to its busy timeout on another worker's
+    write, so its calls run in the threadpool; the in-memory backend is
+    called inline.
+    """
+    if availability_cache.blocking:
+        return await run_in_threadpool(function, *args, **kwargs)
+    return function(*args, **kwargs)
+
+def write_availability(inventories: dict):
+    """Store {(concert_id, seat_type): (available, version) or None} in the cache"""
+    for (concert_id, seat_type), inventory in inventories.items():
+        if inventory is None:
+            availability_cache.invalidate_concert(concert_id)
+            continue
+        available, version = inventory
+        availability_cache.set(concert_id, seat_type, available, version=version)
+
+async def update_availability_cache(concert_id: int, seat_type: str, inventory: Optional[tuple]):
+    """
+    Write a committed (available, version) from adjust_inventory through to
+    the cache, so readers never recount after a mutation.
+
+    Called right after the commit. The version keeps a slower request from
+    overwriting a newer count.
+    """
+    await call_availability_cache(write_availability, {(concert_id, seat_type): inventory})
+
+async def update_group_availability(changes: dict):
+    """Write the counts from a group transition through to the cache"""
+    await call_availability_cache(write_availability, {
+        key: (available, version) for key, (_, available, version) in changes.items()
+    })
+
+async def sweep_expired_reservations(batch_size: int = RESERVATION_SWEEP_BATCH_SIZE) -> int:
+    """
+    Expire every reservation whose hold has run out and return its seats.
+
+    Each batch commits in its own short transaction, and the loop yields to
+    the event loop between batches so request handlers can write in between.
+    """
+    reclaimed = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            released = await db.run_sync(expire_reservations, datetime.now(), batch_size)
+            await db.commit()
+        
+        await update_group_availability(released)
+        
+        batch_count = sum(quantity for quantity, _, _ in released.values())
+        reclaimed += batch_count
+        if batch_count < batch_size:
+            break
+        await asyncio.sleep(0)
+    
+    reservation_sweeper_stats["last_run"] = datetime.now()
+    reservation_sweeper_stats["last_reclaimed"] = reclaimed
+    reservation_sweeper_stats["total_reclaimed"] += reclaimed
+    logging.info(f"Reservation sweep reclaimed {reclaimed} expired tickets")
+    return reclaimed
+
+async def run_reservation_sweeper():
+    """Run sweep_expired_reservations every RESERVATION_SWEEP_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(RESERVATION_SWEEP_INTERVAL)
+        try:
+            await sweep_expired_reservations()
+        except Exception as e:
+            logging.error(f"Error sweeping expired reservations: {str(e)}")
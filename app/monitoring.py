@@ -1,81 +1,319 @@
+import bisect
+import math
 import time
+import itertools
 import logging
-import statistics
-from typing import Dict, List
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from logging_config import bind_request, unbind_request
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
+# Request ids are a per-process prefix plus a counter, which is much cheaper
+# than a random id per request and still unique across workers
+_REQUEST_ID_PREFIX = f"{os.getpid():x}{int(time.time()):x}"
+_request_ids = itertools.count()
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram in the style of an HDR histogram.
+
+    Each bucket is `growth` times wider than the one before it, so any
+    percentile is reported within that relative error in fixed memory, no
+    matter how many values were recorded. Histograms with the same
+    parameters merge by adding their counts. Values are in whatever unit
+    `min_value` is given in: seconds for the service monitor, milliseconds
+    for JTL results.
+    """
+
+    def __init__(self, min_value: float = 1e-6, growth: float = 1.02):
+        self.min_value = min_value
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def bucket_index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_growth) + 1
+
+    def bucket_indexes(self, values) -> np.ndarray:
+        """bucket_index of each value in an array"""
+        values = np.asarray(values, dtype=np.float64)
+        indexes = np.zeros(len(values), dtype=np.int64)
+        above = values > self.min_value
+        indexes[above] = (np.log(values[above] / self.min_value) / self._log_growth).astype(np.int64) + 1
+        return indexes
+
+    def bucket_values(self, indexes) -> np.ndarray:
+        """Value each bucket reports, the geometric middle of its range"""
+        indexes = np.asarray(indexes)
+        return np.where(indexes == 0, self.min_value, self.min_value * self.growth ** (indexes - 0.5))
+
+    def record(self, value: float):
+        # bucket_index inlined; this runs once per request
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = int(math.log(value / self.min_value) / self._log_growth) + 1
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def record_all(self, values):
+        """Record an array of values at once"""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        indexes, counts = np.unique(self.bucket_indexes(values), return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += len(values)
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        if other.total:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """Value at quantile `q` (0-1), from the geometric middle of its bucket"""
+        if not self.total:
+            return 0
+        rank = q * self.total
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                break
+        value = float(self.bucket_values(index))
+        # The exact extremes are known, so never report past them
+        return min(max(value, self.min), self.max)
+
+    def reset(self):
+        self.counts.clear()
+        self.total = 0
+        self.min = None
+        self.max = None
+
+# Upper bounds, in seconds, of the Prometheus request latency buckets
+PROMETHEUS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RouteMetrics:
+    """Request count and cumulative latency buckets for one label set"""
+
+    __slots__ = ("count", "duration_sum", "bucket_counts")
+
+    def __init__(self):
+        self.count = 0
+        self.duration_sum = 0.0
+        # One count per bound in PROMETHEUS_LATENCY_BUCKETS, then +Inf
+        self.bucket_counts = [0] * (len(PROMETHEUS_LATENCY_BUCKETS) + 1)
+
+    def record(self, duration: float):
+        self.count += 1
+        self.duration_sum += duration
+        self.bucket_counts[bisect.bisect_left(PROMETHEUS_LATENCY_BUCKETS, duration)] += 1
+
+def status_class(status: int) -> str:
+    """Prometheus status label for an HTTP status code, e.g. 4xx for 404"""
+    return f"{status // 100}xx"
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+class _Bucket:
+    """Counters for the requests recorded in one time slot of the ring"""
+
+    __slots__ = ("slot", "count", "successes", "errors", "fast", "duration_sum", "latency")
+
+    def __init__(self):
+        self.slot = -1
+        self.count = 0
+        self.successes = 0
+        self.errors = 0
+        self.fast = 0
+        self.duration_sum = 0.0
+        self.latency = LatencyHistogram()
+
+    def reset(self, slot: int):
+        self.slot = slot
+        self.count = 0
+        self.successes = 0
+        self.errors = 0
+        self.fast = 0
+        self.duration_sum = 0.0
+        self.latency.reset()
 
 class ServiceMonitor:
-    def __init__(self, window_size: int = 3600):
+    """
+    Request metrics over a sliding window in fixed memory.
+
+    Requests are counted in a ring of `window_size / bucket_seconds` time
+    buckets, each holding its own counters and latency histogram. A bucket
+    is reset when the ring comes back around to it, so recording is O(1)
+    and queries merge at most one bucket per slot of the window.
+    """
+
+    # Window for availability, reliability and latency percentiles
+    RECENT_WINDOW = 300
+
+    def __init__(self, window_size: int = 3600, bucket_seconds: int = 10):
         self.window_size = window_size
-        self.requests: List[Dict] = []
+        self.bucket_seconds = bucket_seconds
+        self._buckets: List[_Bucket] = [_Bucket() for _ in range(math.ceil(window_size / bucket_seconds))]
         self.total_requests = 0
         self.failed_requests = 0
         self._metrics_cache = {}
         self._last_cache_time = 0
         self._cache_ttl = 1
+        self.caches = {}
+        self.pools = {}
+        # Labelled series for /metrics, keyed by (route, method, status class)
+        self.routes: Dict[Tuple[str, str, str], RouteMetrics] = {}
+        self.in_flight: Dict[Tuple[str, str], int] = {}
+        # [queries, seconds] per (route, method), filled by record_queries
+        self.route_queries: Dict[Tuple[str, str], List] = {}
+        self.query_monitor = None
 
-    def _clean_old_requests(self):
-        current_time = time.time()
-        cutoff_time = current_time - self.window_size
-        self.requests = [r for r in self.requests if r["timestamp"] > cutoff_time]
+    def register_cache(self, name: str, cache):
+        """Report the stats() of an application cache alongside the request metrics"""
+        self.caches[name] = cache
 
-    def record_request(self, duration: float, success: bool):
-        current_time = time.time()
+    def get_cache_stats(self) -> Dict:
+        return {name: cache.stats() for name, cache in self.caches.items()}
+
+    def register_pool(self, name: str, engine):
+        """Report connection pool usage and checkout waits of an engine"""
+        self.pools[name] = engine
+
+    def get_pool_stats(self) -> Dict:
+        # engine.dispose() replaces the pool, so look it up on every call
+        return {
+            name: engine.pool.stats()
+            for name, engine in self.pools.items()
+            if hasattr(engine.pool, "stats")
+        }
+
+    def register_query_monitor(self, query_monitor):
+        """Report SQL query totals, slow queries and duplicates of a QueryMonitor"""
+        self.query_monitor = query_monitor
+
+    def get_query_stats(self) -> Dict:
+        return self.query_monitor.stats() if self.query_monitor else {}
+
+    def record_queries(self, route: str, method: str, count: int, duration: float):
+        """Add the SQL queries one request ran to its route's totals"""
+        totals = self.route_queries.get((route, method))
+        if totals is None:
+            totals = self.route_queries[(route, method)] = [0, 0.0]
+        totals[0] += count
+        totals[1] += duration
+
+    def _recent_buckets(self, current_time: float, seconds: float) -> List[_Bucket]:
+        """Buckets holding requests from the last `seconds`"""
+        current_slot = int(current_time // self.bucket_seconds)
+        oldest_slot = current_slot - min(math.ceil(seconds / self.bucket_seconds), len(self._buckets)) + 1
+        return [b for b in self._buckets if oldest_slot <= b.slot <= current_slot]
+
+    def request_started(self, route: str, method: str):
+        key = (route, method)
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def request_finished(self, route: str, method: str):
+        self.in_flight[(route, method)] -= 1
+
+    def record_request(
+        self,
+        duration: float,
+        success: bool,
+        route: Optional[str] = None,
+        method: Optional[str] = None,
+        status: Optional[int] = None
+    ):
+        """
+        Record one finished request.
+
+        With a route template and method the request is also counted in the
+        labelled series exported by render_prometheus. `status` defaults to
+        200 or 500 depending on `success`.
+        """
+        if route is not None:
+            if status is None:
+                status = 200 if success else 500
+            key = (route, method or "", status_class(status))
+            metrics = self.routes.get(key)
+            if metrics is None:
+                metrics = self.routes[key] = RouteMetrics()
+            metrics.record(duration)
+
+        slot = int(time.time() // self.bucket_seconds)
+        bucket = self._buckets[slot % len(self._buckets)]
+        if bucket.slot != slot:
+            bucket.reset(slot)
         is_error = not success and duration > 0.001
-        
-        self.requests.append({
-            "timestamp": current_time,
-            "duration": duration,
-            "success": success,
-            "is_error": is_error
-        })
-        
+
+        bucket.count += 1
+        bucket.duration_sum += duration
+        bucket.latency.record(duration)
+        if success:
+            bucket.successes += 1
+        if is_error:
+            bucket.errors += 1
+        if duration < 0.001:
+            bucket.fast += 1
+
         self.total_requests += 1
         if is_error:
             self.failed_requests += 1
-        
-        self._metrics_cache = {}
+
+        if self._metrics_cache:
+            self._metrics_cache = {}
 
     def get_metrics(self) -> Dict:
         current_time = time.time()
         if self._metrics_cache and (current_time - self._last_cache_time) < self._cache_ttl:
             return self._metrics_cache.copy()
 
-        self._clean_old_requests()
-        
-        if not self.requests:
-            return {
-                "availability": 100.0,
-                "reliability": 100.0,
-                "avg_response_time": 0,
-                "total_requests": 0,
-                "failed_requests": 0,
-                "requests_last_hour": 0,
-                "latency_p95": 0
-            }
+        requests_last_hour = sum(b.count for b in self._recent_buckets(current_time, self.window_size))
+        recent_buckets = self._recent_buckets(current_time, self.RECENT_WINDOW)
+        recent_count = sum(b.count for b in recent_buckets)
+
+        if recent_count:
+            availability = sum(b.successes for b in recent_buckets) / recent_count * 100
+            reliability = sum(b.fast for b in recent_buckets) / recent_count * 100
+            avg_duration = sum(b.duration_sum for b in recent_buckets) / recent_count
 
-        recent_requests = [r for r in self.requests if r["timestamp"] > (current_time - 300)]
-        
-        if recent_requests:
-            successful_requests = sum(1 for r in recent_requests if r["success"])
-            availability = (successful_requests / len(recent_requests)) * 100
-            
-            durations = [r["duration"] for r in recent_requests]
-            avg_duration = statistics.mean(durations)
-            
-            # Calcular el percentil 95 de latencia
-            sorted_durations = sorted(durations)
-            p95_index = int(len(sorted_durations) * 0.95)
-            latency_p95 = sorted_durations[p95_index] if p95_index < len(sorted_durations) else sorted_durations[-1]
-            
-            reliability = sum(1 for d in durations if d < 0.001) / len(durations) * 100
+            latency = LatencyHistogram()
+            for bucket in recent_buckets:
+                latency.merge(bucket.latency)
+            percentiles = {
+                f"latency_p{int(q * 100)}": latency.percentile(q)
+                for q in (0.5, 0.9, 0.95, 0.99)
+            }
         else:
             availability = 100.0
             reliability = 100.0
             avg_duration = 0
-            latency_p95 = 0
+            percentiles = {"latency_p50": 0, "latency_p90": 0, "latency_p95": 0, "latency_p99": 0}
 
         metrics = {
             "availability": availability,
@@ -83,11 +321,173 @@ class ServiceMonitor:
             "avg_response_time": avg_duration,
             "total_requests": self.total_requests,
             "failed_requests": self.failed_requests,
-            "requests_last_hour": len(self.requests),
-            "latency_p95": latency_p95
+            "requests_last_hour": requests_last_hour,
+            **percentiles,
+            "caches": self.get_cache_stats(),
+            "pools": self.get_pool_stats(),
+            "queries": self.get_query_stats()
         }
 
         self._metrics_cache = metrics.copy()
         self._last_cache_time = current_time
-        
-        return metrics
\ No newline at end of file
+
+        return metrics
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP concert_http_requests_total Requests handled, by route template, method and status class.",
+            "# TYPE concert_http_requests_total counter"
+        ]
+        for (route, method, status), metrics in sorted(self.routes.items()):
+            lines.append(f"concert_http_requests_total{_labels(route=route, method=method, status=status)} {metrics.count}")
+
+        lines += [
+            "# HELP concert_http_request_duration_seconds Request latency, by route template, method and status class.",
+            "# TYPE concert_http_request_duration_seconds histogram"
+        ]
+        for (route, method, status), metrics in sorted(self.routes.items()):
+            cumulative = 0
+            for bound, count in zip(PROMETHEUS_LATENCY_BUCKETS + ("+Inf",), metrics.bucket_counts):
+                cumulative += count
+                labels = _labels(route=route, method=method, status=status, le=bound)
+                lines.append(f"concert_http_request_duration_seconds_bucket{labels} {cumulative}")
+            labels = _labels(route=route, method=method, status=status)
+            lines.append(f"concert_http_request_duration_seconds_sum{labels} {metrics.duration_sum}")
+            lines.append(f"concert_http_request_duration_seconds_count{labels} {metrics.count}")
+
+        lines += [
+            "# HELP concert_http_requests_in_flight Requests currently being handled.",
+            "# TYPE concert_http_requests_in_flight gauge"
+        ]
+        for (route, method), count in sorted(self.in_flight.items()):
+            lines.append(f"concert_http_requests_in_flight{_labels(route=route, method=method)} {count}")
+
+        cache_stats = self.get_cache_stats()
+        for stat, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                           ("expirations", "counter"), ("size", "gauge")):
+            name = f"concert_cache_{stat}_total" if kind == "counter" else f"concert_cache_{stat}"
+            lines += [f"# HELP {name} Application cache {stat}.", f"# TYPE {name} {kind}"]
+            for cache, stats in sorted(cache_stats.items()):
+                lines.append(f"{name}{_labels(cache=cache)} {stats.get(stat, 0)}")
+
+        pool_stats = self.get_pool_stats()
+        for stat, name, kind in (("checkouts", "concert_db_pool_checkouts_total", "counter"),
+                                 ("timeouts", "concert_db_pool_timeouts_total", "counter"),
+                                 ("checked_out", "concert_db_pool_checked_out", "gauge")):
+            lines += [f"# HELP {name} Database connection pool {stat.replace('_', ' ')}.", f"# TYPE {name} {kind}"]
+            for pool, stats in sorted(pool_stats.items()):
+                lines.append(f"{name}{_labels(pool=pool)} {stats.get(stat, 0)}")
+
+        lines += [
+            "# HELP concert_db_queries_total SQL queries run, by the route that ran them.",
+            "# TYPE concert_db_queries_total counter"
+        ]
+        for (route, method), (count, _) in sorted(self.route_queries.items()):
+            lines.append(f"concert_db_queries_total{_labels(route=route, method=method)} {count}")
+        lines += [
+            "# HELP concert_db_query_seconds_total Time spent in SQL queries, by the route that ran them.",
+            "# TYPE concert_db_query_seconds_total counter"
+        ]
+        for (route, method), (_, duration) in sorted(self.route_queries.items()):
+            lines.append(f"concert_db_query_seconds_total{_labels(route=route, method=method)} {duration}")
+
+        query_stats = self.get_query_stats()
+        if query_stats:
+            lines += [
+                "# HELP concert_db_slow_queries_total SQL queries slower than the slow query threshold.",
+                "# TYPE concert_db_slow_queries_total counter",
+                f"concert_db_slow_queries_total {query_stats['slow_queries']}",
+                "# HELP concert_db_duplicate_queries_total Statements repeated within one request past the duplicate threshold.",
+                "# TYPE concert_db_duplicate_queries_total counter",
+                f"concert_db_duplicate_queries_total {query_stats['duplicate_queries']}"
+            ]
+
+        return "\n".join(lines) + "\n"
+
+class TimingMiddleware:
+    """
+    ASGI middleware timing every HTTP request into a ServiceMonitor.
+
+    The clock starts before routing and stops once the app returns, so
+    raised HTTPExceptions and unhandled errors are recorded with the status
+    they were answered with. Requests are attributed to the route template
+    the router matched, or "unmatched". Recording only updates in-memory
+    counters, so it never blocks the event loop.
+
+    With a QueryMonitor the SQL queries of each request are counted against
+    its route, and `debug_headers` adds the request's query count and time
+    as X-DB-Query-Count and X-DB-Query-Time-Ms response headers.
+
+    Log records made while handling a request carry its request id, taken
+    from an X-Request-ID header or generated and echoed back. `access_log`
+    adds one sampled access line per request with its status and latency.
+    """
+
+    def __init__(
+        self,
+        app,
+        monitor: ServiceMonitor,
+        query_monitor=None,
+        debug_headers: bool = False,
+        access_log: bool = False
+    ):
+        self.app = app
+        self.monitor = monitor
+        self.query_monitor = query_monitor
+        self.debug_headers = debug_headers and query_monitor is not None
+        self.access_log = access_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        status = 500
+        queries_token = self.query_monitor.start_request() if self.query_monitor else None
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id:
+            request_id = f"{_REQUEST_ID_PREFIX}-{next(_request_ids):x}"
+        log_token = bind_request(request_id, scope)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+                if self.debug_headers:
+                    queries = self.query_monitor.current_request()
+                    headers += [
+                        (b"x-db-query-count", str(queries.count).encode()),
+                        (b"x-db-query-time-ms", f"{queries.duration * 1000:.3f}".encode())
+                    ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            duration = (time.perf_counter_ns() - start) / 1e9
+            self.monitor.record_request(
+                duration=duration,
+                success=status < 500,
+                route=route,
+                method=scope["method"],
+                status=status
+            )
+            if queries_token is not None:
+                queries = self.query_monitor.finish_request(queries_token, route)
+                self.monitor.record_queries(route, scope["method"], queries.count, queries.duration)
+            if self.access_log:
+                access_logger.info(
+                    f"{scope['method']} {route} {status} {duration * 1000:.1f}ms",
+                    extra={"method": scope["method"], "status": status, "latency_ms": duration * 1000, "sample": True}
+                )
+            unbind_request(log_token)
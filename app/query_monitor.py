@@ -0,0 +1,134 @@
+import contextvars
+import functools
+import logging
+import re
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Bound parameters of the sqlite, asyncpg and psycopg2 drivers
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=4096)
+def normalize_statement(statement: str) -> str:
+    """
+    Reduce a SQL statement to its shape, so the same query with different
+    values, parameter styles or IN-list lengths normalizes to one string.
+
+    Compiled statements repeat with their values bound separately, so the
+    results are cached.
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+class RequestQueries:
+    """Queries run on behalf of one request"""
+
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Raw statement text; normalized once when the request finishes
+        self.statements: Counter = Counter()
+
+# Queries of the request being handled in the current task, if any
+_current_request: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar(
+    "current_request_queries", default=None
+)
+
+class QueryMonitor:
+    """
+    Counts and times every SQL statement through cursor execution events.
+
+    Statements run while a request is being handled are attributed to it
+    through a context variable, which SQLAlchemy carries into run_sync. A
+    statement slower than `slow_query_threshold` seconds is logged in
+    normalized form, and a normalized statement run `duplicate_threshold`
+    times or more within one request is reported as a likely N+1.
+    """
+
+    def __init__(self, slow_query_threshold: float = 0.1, duplicate_threshold: int = 3, max_slow_queries: int = 100):
+        self.slow_query_threshold = slow_query_threshold
+        self.duplicate_threshold = duplicate_threshold
+        self.total_queries = 0
+        self.total_duration = 0.0
+        self.slow_queries = 0
+        self.duplicate_queries = 0
+        self.recent_slow_queries = deque(maxlen=max_slow_queries)
+
+    def instrument(self, engine):
+        """Time the statements of a sync engine, or of an async engine's sync_engine"""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_start_times"].pop()
+        self.total_queries += 1
+        self.total_duration += duration
+
+        request = _current_request.get()
+        if request is not None:
+            request.count += 1
+            request.duration += duration
+            request.statements[statement] += 1
+
+        if duration >= self.slow_query_threshold:
+            normalized = normalize_statement(statement)
+            self.slow_queries += 1
+            self.recent_slow_queries.append({"statement": normalized, "duration_ms": duration * 1000})
+            logger.warning(f"Slow query ({duration * 1000:.1f} ms): {normalized}")
+
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_times"):
+            conn.info["query_start_times"].pop()
+
+    def start_request(self) -> contextvars.Token:
+        """Attribute the queries of the current task to a new request"""
+        return _current_request.set(RequestQueries())
+
+    def current_request(self) -> Optional[RequestQueries]:
+        return _current_request.get()
+
+    def finish_request(self, token: contextvars.Token, route: str) -> RequestQueries:
+        """Stop attributing queries and report the request's duplicates"""
+        request = _current_request.get()
+        _current_request.reset(token)
+        if request.count < self.duplicate_threshold:
+            return request  # Too few queries for any of them to repeat enough
+
+        normalized = Counter()
+        for statement, count in request.statements.items():
+            normalized[normalize_statement(statement)] += count
+        for statement, count in normalized.items():
+            if count >= self.duplicate_threshold:
+                self.duplicate_queries += 1
+                logger.warning(f"Query ran {count} times in one {route} request: {statement}")
+        return request
+
+    def stats(self) -> Dict:
+        return {
+            "total_queries": self.total_queries,
+            "total_time_ms": self.total_duration * 1000,
+            "avg_time_ms": self.total_duration / self.total_queries * 1000 if self.total_queries else 0,
+            "slow_queries": self.slow_queries,
+            "duplicate_queries": self.duplicate_queries,
+            "recent_slow_queries": list(self.recent_slow_queries)
+        }
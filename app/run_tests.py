@@ -1,3 +1,5 @@
+import asyncio
+import numbers
 import os
 import subprocess
 import pytest
@@ -14,7 +16,6 @@ class TestRunner:
         """Create necessary directories if they don't exist"""
         Path("tests/out").mkdir(parents=True, exist_ok=True)
         Path("coverage").mkdir(exist_ok=True)
-        Path("tests/jmeter").mkdir(parents=True, exist_ok=True)
         
     def setup_logging(self):
         """Configure logging"""
@@ -41,50 +42,60 @@ class TestRunner:
     def run_unit_tests(self):
         """Run unit tests with coverage"""
         logging.info("Running unit tests with coverage...")
+        from calculate_metrics import COVERAGE_XML, record_coverage
         result = pytest.main([
-            '--cov=app',
+            '--cov=.',
             '--cov-report=html',
             '--cov-report=term-missing',
-            '--cov-report=xml:coverage/coverage.xml',
-            'tests/integration',
+            f'--cov-report=xml:{COVERAGE_XML}',
+            'tests',
             '-v'
         ])
         
-        # Save coverage percentage
-        if os.path.exists("coverage/coverage.xml"):
-            import xml.etree.ElementTree as ET
-            tree = ET.parse("coverage/coverage.xml")
-            root = tree.getroot()
-            coverage = float(root.attrib['line-rate']) * 100
-            with open("coverage/coverage.txt", "w") as f:
-                f.write(str(coverage))
+        # Cache the coverage percentage for this source tree
+        if os.path.exists(COVERAGE_XML):
+            record_coverage()
         
         return result == 0
 
     def run_performance_tests(self):
-        """Run JMeter performance tests"""
-        logging.info("Running JMeter performance tests...")
+        """Run the load test, in-process unless LOAD_TEST_URL points at a server"""
+        from load_test import run_load_test
+        logging.info("Running performance tests...")
+        base_url = os.getenv("LOAD_TEST_URL")
+        target = None
+        if base_url:
+            target = {
+                "concert_id": int(os.getenv("LOAD_TEST_CONCERT_ID", "1")),
+                "user_id": int(os.getenv("LOAD_TEST_USER_ID", "1"))
+            }
         try:
-            result = subprocess.run([
-                "jmeter",
-                "-n",
-                "-t", "tests/jmeter/test_plan.jmx",
-                "-l", "tests/out/results.jtl"
-            ], check=True)
+            # 10 users looping 5 times over every scenario
+            results = asyncio.run(run_load_test(
+                output="tests/out/results.jtl",
+                users=10,
+                iterations=5,
+                base_url=base_url,
+                target=target
+            ))
+            logging.info(f"Load test wrote {results['samples']} samples ({results['errors']} errors)")
             return True
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error running JMeter tests: {str(e)}")
+        except Exception as e:
+            logging.error(f"Error running performance tests: {str(e)}")
             return False
 
     def calculate_metrics(self):
         """Calculate and display test metrics"""
         from calculate_metrics import calculate_metrics
         try:
-            results = calculate_metrics("tests/out/results.jtl")
+            # Coverage was recorded by run_unit_tests, never rerun it here
+            results = calculate_metrics("tests/out/results.jtl", coverage=False)
             logging.info("\nTest Results Summary:")
             logging.info("-" * 40)
             for metric, value in results.items():
-                logging.info(f"{metric}: {value:.2f}")
+                # Per-label and per-interval breakdowns are left to show_metrics
+                if isinstance(value, numbers.Real):
+                    logging.info(f"{metric}: {value:.2f}")
             return results
         except Exception as e:
             logging.error(f"Error calculating metrics: {str(e)}")
@@ -1,18 +1,71 @@
+import argparse
+import glob
+import gzip
+import json
 import os
 import datetime
 import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
-def analyze_logs():
-    """Analyzes concert booking and test run logs for the current day."""
-    metrics = {
+# Bytes of plain log handed to each worker process
+CHUNK_SIZE = 64 * 1024 * 1024
+
+# Checkpoints of the incremental mode
+STATE_FILE = ".searchlogs_state.json"
+# Checkpoints of files last written longer ago than this are dropped
+STATE_RETENTION_DAYS = 7
+
+# Lines are matched as bytes so chunks never need decoding
+RETRIEVED_CONCERTS = re.compile(rb"retrieved (\d+) concerts")
+# "2026-10-17 17:14:21,174 - ..." and JSON lines from logging_config
+TEXT_TIMESTAMP = re.compile(rb"(\d{4}-\d{2}-\d{2})[ T](\d{2})")
+JSON_TIMESTAMP_PREFIX = b'{"time": "'
+
+CATEGORIES = ['requests', 'retrievals', 'confirmations', 'cancellations', 'errors']
+
+def empty_metrics():
+    return {
         'retrievals': 0,
-        'confirmations': 0, 
+        'confirmations': 0,
         'cancellations': 0,
         'requests': 0,
         'errors': 0,
         'total_concerts': 0
     }
 
+def classify_line(line: bytes):
+    """
+    Category of a log line and the number of concerts it reports.
+
+    Returns:
+        tuple: (category or None, concerts)
+    """
+    if b"Successfully retrieved" in line:
+        match = RETRIEVED_CONCERTS.search(line)
+        return 'retrievals', int(match.group(1)) if match else 0
+    elif b"HTTP Request:" in line:
+        return 'requests', 0
+    elif b"Successfully confirmed ticket" in line:
+        return 'confirmations', 0
+    elif b"Successfully cancelled ticket" in line:
+        return 'cancellations', 0
+    elif b"ERROR" in line:
+        return 'errors', 0
+    return None, 0
+
+def line_hour(line: bytes):
+    """(date, hour) of a timestamped line as bytes, or None for continuation lines"""
+    start = len(JSON_TIMESTAMP_PREFIX) if line.startswith(JSON_TIMESTAMP_PREFIX) else 0
+    match = TEXT_TIMESTAMP.match(line, start)
+    return (match.group(1), match.group(2)) if match else None
+
+def analyze_logs():
+    """Analyzes concert booking and test run logs for the current day."""
+    metrics = empty_metrics()
+
     today = datetime.datetime.now()
     log_files = [
         f"concert_booking_{today.strftime('%d_%m_%Y')}.log",
@@ -22,26 +75,281 @@ def analyze_logs():
     for log_file in log_files:
         if not os.path.exists(log_file):
             continue
-            
-        with open(log_file) as f:
+
+        with open(log_file, 'rb') as f:
             for line in f:
-                if "Successfully retrieved" in line:
-                    metrics['retrievals'] += 1
-                    match = re.search(r"retrieved (\d+) concerts", line)
-                    if match:
-                        metrics['total_concerts'] += int(match.group(1))
-                elif "HTTP Request:" in line:
-                    metrics['requests'] += 1
-                elif "Successfully confirmed ticket" in line:
-                    metrics['confirmations'] += 1
-                elif "Successfully cancelled ticket" in line:
-                    metrics['cancellations'] += 1
-                elif "ERROR" in line:
-                    metrics['errors'] += 1
+                category, concerts = classify_line(line)
+                if category:
+                    metrics[category] += 1
+                    metrics['total_concerts'] += concerts
 
     print_report(metrics)
     return metrics
 
+def plan_chunks(paths, chunk_size=CHUNK_SIZE):
+    """
+    Split log files into (path, start, end) byte ranges.
+
+    Plain files are cut every `chunk_size` bytes; a chunk owns the lines
+    that start inside its range. Gzipped files cannot be entered mid-stream,
+    so each one is a single chunk with end None.
+    """
+    chunks = []
+    for path in paths:
+        if path.endswith('.gz'):
+            chunks.append((path, 0, None))
+            continue
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), chunk_size):
+            chunks.append((path, start, min(start + chunk_size, size)))
+    return chunks
+
+def read_chunk(path, start, end):
+    """Yield the lines of a chunk from plan_chunks"""
+    if end is None:
+        with gzip.open(path, 'rb') as f:
+            yield from f
+        return
+
+    with open(path, 'rb') as f:
+        position = start
+        if start:
+            # Skip the line the previous chunk owns
+            f.seek(start - 1)
+            position += len(f.readline()) - 1
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+def analyze_chunk(chunk, date_from=None, date_to=None):
+    """
+    Count the lines of one chunk, optionally limited to a date range.
+
+    Lines without a timestamp (e.g. tracebacks) belong to the last
+    timestamped line before them; at the very start of a chunk there is
+    none, so they are counted without an hour or date check.
+
+    Returns:
+        tuple: (metrics, hourly), where hourly counts each category per
+        (date, hour)
+    """
+    return count_lines(read_chunk(*chunk), date_from, date_to)
+
+def count_lines(lines, date_from=None, date_to=None):
+    """Count an iterable of log lines; see analyze_chunk"""
+    metrics = empty_metrics()
+    hourly = {}
+    hour = None
+    in_range = True
+    for line in lines:
+        stamp = line_hour(line)
+        if stamp is not None:
+            hour = stamp
+            in_range = (date_from is None or stamp[0] >= date_from) and (date_to is None or stamp[0] <= date_to)
+        if not in_range:
+            continue
+        category, concerts = classify_line(line)
+        if category:
+            metrics[category] += 1
+            metrics['total_concerts'] += concerts
+            if hour is not None:
+                hourly.setdefault(hour, Counter())[category] += 1
+    return metrics, hourly
+
+def merge_results(results):
+    """Add up the (metrics, hourly) pairs of several chunks"""
+    metrics = empty_metrics()
+    hourly = {}
+    for chunk_metrics, chunk_hourly in results:
+        for key, value in chunk_metrics.items():
+            metrics[key] += value
+        for hour, counts in chunk_hourly.items():
+            hourly.setdefault(hour, Counter()).update(counts)
+    return metrics, hourly
+
+def find_log_files(patterns, date_from=None):
+    """Files matching the glob patterns, skipping any last written before `date_from`"""
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if date_from is None:
+        return paths
+    cutoff = datetime.datetime.combine(date_from, datetime.time.min).timestamp()
+    return [path for path in paths if os.path.getmtime(path) >= cutoff]
+
+def analyze_files(paths, date_from=None, date_to=None, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Analyze plain or gzipped log files in parallel chunks.
+
+    Args:
+        paths: Log files to read
+        date_from, date_to: Inclusive datetime.date bounds, or None
+        workers: Worker processes, defaults to the CPU count
+        chunk_size: Bytes of plain log per chunk
+
+    Returns:
+        tuple: (metrics, hourly) as from analyze_chunk, merged over all files
+    """
+    chunks = plan_chunks(paths, chunk_size)
+    bounds = [d.isoformat().encode() if d else None for d in (date_from, date_to)]
+    if workers == 1 or len(chunks) <= 1:
+        return merge_results(analyze_chunk(chunk, *bounds) for chunk in chunks)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_results(pool.map(
+            analyze_chunk, chunks, repeat(bounds[0]), repeat(bounds[1])
+        ))
+
+def read_complete_lines(f, offset, progress):
+    """
+    Yield the whole lines after `offset`, adding their length to progress[0].
+
+    A last line without its newline is still being written; it is left
+    for the next run.
+    """
+    f.seek(offset)
+    for line in f:
+        if not line.endswith(b"\n"):
+            break
+        progress[0] += len(line)
+        yield line
+
+def _checkpoint_tail(path, checkpoint):
+    """Count what was appended to `path` since its checkpoint and move it forward"""
+    progress = [checkpoint["offset"]]
+    if path.endswith('.gz'):
+        # Rotated archives are complete once written; read them only once
+        if checkpoint["offset"]:
+            return
+        with gzip.open(path, 'rb') as f:
+            metrics, hourly = count_lines(f)
+        progress[0] = os.path.getsize(path)
+    else:
+        with open(path, 'rb') as f:
+            metrics, hourly = count_lines(read_complete_lines(f, checkpoint["offset"], progress))
+    checkpoint["offset"] = progress[0]
+    for key, value in metrics.items():
+        checkpoint["metrics"][key] += value
+    for (date, hour), counts in hourly.items():
+        label = f"{date.decode()} {hour.decode()}"
+        checkpoint["hourly"].setdefault(label, Counter()).update(counts)
+
+def _new_checkpoint(inode):
+    return {"inode": inode, "offset": 0, "metrics": empty_metrics(), "hourly": {}}
+
+def _find_inode(directory, inode):
+    """Path of the file in `directory` with the given inode, e.g. a rotated log"""
+    for entry in os.scandir(directory or "."):
+        if entry.is_file() and entry.inode() == inode:
+            return entry.path
+    return None
+
+def _merge_checkpoint(into, checkpoint):
+    """Fold a second checkpoint of the same file into `into`, keeping the one read furthest"""
+    if checkpoint["offset"] > into["offset"]:
+        into.update(checkpoint)
+
+def _relocate_checkpoints(state):
+    """
+    Move every checkpoint to the path its file has now.
+
+    Rotation renames a file but keeps its inode, so checkpoints are matched
+    by inode. The whole state moves at once, so in a chain (.1 -> .2 while
+    the log becomes .1) no checkpoint overwrites another. Checkpoints whose
+    file is gone are dropped.
+
+    Returns:
+        dict: {old path: new path} for each checkpoint that moved
+    """
+    located = {}
+    moved = {}
+    for path, checkpoint in state.items():
+        try:
+            same_file = os.stat(path).st_ino == checkpoint["inode"]
+        except FileNotFoundError:
+            same_file = False
+        new_path = path if same_file else _find_inode(os.path.dirname(path), checkpoint["inode"])
+        if new_path is None:
+            continue
+        if new_path != path:
+            moved[path] = new_path
+        if new_path in located:
+            _merge_checkpoint(located[new_path], checkpoint)
+        else:
+            located[new_path] = checkpoint
+    state.clear()
+    state.update(located)
+    return moved
+
+def _prune_state(state, keep, retention_days):
+    """Drop checkpoints of files not written for `retention_days`, except those in `keep`"""
+    cutoff = time.time() - retention_days * 24 * 3600
+    for path in list(state):
+        if path not in keep and os.path.getmtime(path) < cutoff:
+            del state[path]
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path) as f:
+        state = json.load(f)
+    for checkpoint in state.values():
+        checkpoint["hourly"] = {label: Counter(counts) for label, counts in checkpoint["hourly"].items()}
+    return state
+
+def save_state(state_path, state):
+    # Written aside and renamed so a crash never leaves a torn state file
+    temporary_path = f"{state_path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temporary_path, state_path)
+
+def analyze_incremental(paths, state_path=STATE_FILE, catch_up=False, retention_days=STATE_RETENTION_DAYS):
+    """
+    Roll the counters of each log file forward from its last checkpoint.
+
+    A checkpoint holds the file's inode, the offset read up to and the
+    counters so far, so a run reads only the bytes appended since the last
+    one. Checkpoints follow their file by inode, so when a path was rotated
+    the old file's unread tail is added to its checkpoint under its new
+    name, that checkpoint is still reported with the path this run, and the
+    path starts over. A file that shrank was truncated and is reread from
+    the start.
+
+    Args:
+        paths: Log files to report on
+        catch_up: Also read the tails of the other checkpointed files, e.g.
+            yesterday's log, into their own checkpoints without reporting them
+        retention_days: Checkpoints of other files not written for this
+            many days are dropped
+
+    Returns:
+        tuple: (metrics, hourly) over the checkpoints of `paths`, with
+        hourly in the same form as analyze_files
+    """
+    state = load_state(state_path)
+    moved = _relocate_checkpoints(state)
+    reported = list(dict.fromkeys([*paths, *(moved[path] for path in paths if path in moved)]))
+    _prune_state(state, reported, retention_days)
+    for path in dict.fromkeys([*reported, *(state if catch_up else ())]):
+        stat = os.stat(path)
+        checkpoint = state.get(path)
+        if checkpoint is not None and stat.st_size < checkpoint["offset"]:
+            checkpoint = None
+        if checkpoint is None:
+            checkpoint = state[path] = _new_checkpoint(stat.st_ino)
+        _checkpoint_tail(path, checkpoint)
+    save_state(state_path, state)
+
+    results = []
+    for path in reported:
+        hourly = {
+            tuple(part.encode() for part in label.split(" ")): counts
+            for label, counts in state[path]["hourly"].items()
+        }
+        results.append((state[path]["metrics"], hourly))
+    return merge_results(results)
+
 def print_report(metrics):
     """Prints a simple report of the metrics."""
     print("\nLog Analysis Summary")
@@ -55,6 +363,15 @@ def print_report(metrics):
     success_rate = calculate_success_rate(metrics)
     print(f"Success Rate: {success_rate:.1f}%")
 
+def print_hourly_report(hourly):
+    """Prints the per-hour counts of each category."""
+    print("\nHourly Breakdown")
+    print("-" * 78)
+    print(f"{'hour':<14} " + " ".join(f"{category:>12}" for category in CATEGORIES))
+    for (date, hour), counts in sorted(hourly.items()):
+        label = f"{date.decode()} {hour.decode()}h"
+        print(f"{label:<14} " + " ".join(f"{counts[category]:>12}" for category in CATEGORIES))
+
 def calculate_success_rate(metrics):
     """Calculates success rate percentage."""
     total = metrics['retrievals'] + metrics['confirmations'] + metrics['cancellations']
@@ -62,5 +379,50 @@ def calculate_success_rate(metrics):
         return 100.0
     return ((total - metrics['errors']) / total) * 100
 
+def default_incremental_paths():
+    """Today's log files that exist"""
+    today = datetime.datetime.now()
+    paths = [
+        f"concert_booking_{today.strftime('%d_%m_%Y')}.log",
+        f"test_run_{today.strftime('%Y%m%d')}.log"
+    ]
+    return [path for path in paths if os.path.exists(path)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze concert booking and test run logs")
+    parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat,
+                        help="first day to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat,
+                        help="last day to include (YYYY-MM-DD)")
+    parser.add_argument("--glob", dest="patterns", action="append",
+                        help="log files to read, plain or .gz; may be repeated")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bytes of plain log per chunk")
+    parser.add_argument("--incremental", action="store_true",
+                        help="read only what was appended since the last run, keeping checkpoints in --state")
+    parser.add_argument("--state", default=STATE_FILE, help="checkpoint file of --incremental")
+    args = parser.parse_args(argv)
+
+    if args.incremental:
+        if args.patterns:
+            metrics, hourly = analyze_incremental(find_log_files(args.patterns), args.state)
+        else:
+            # Yesterday's file may have grown after its last run; finish it
+            # without adding it to today's report
+            metrics, hourly = analyze_incremental(default_incremental_paths(), args.state, catch_up=True)
+        print_report(metrics)
+        print_hourly_report(hourly)
+        return metrics
+
+    if not (args.patterns or args.date_from or args.date_to):
+        return analyze_logs()
+
+    patterns = args.patterns or ["concert_booking_*.log*", "test_run_*.log*"]
+    paths = find_log_files(patterns, args.date_from)
+    metrics, hourly = analyze_files(paths, args.date_from, args.date_to, args.workers, args.chunk_size)
+    print_report(metrics)
+    print_hourly_report(hourly)
+    return metrics
+
 if __name__ == '__main__':
-    analyze_logs()
\ No newline at end of file
+    main()
@@ -4,73 +4,41 @@ from datetime import datetime
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
-import subprocess
+import argparse
 
-def analyze_jmeter_results(results_file):
+from calculate_metrics import PERCENTILES, calculate_metrics
+
+def analyze_jmeter_results(results_file, chunksize=None, interval=None, coverage=True):
     """
     Analyzes JMeter test results from a JTL file and generates comprehensive metrics
     
     Args:
         results_file: Path to the JTL file containing JMeter results
+        chunksize: Rows per chunk to stream the file with bounded memory
+        interval: Seconds per time bucket in the per-interval breakdown
+        coverage: Rerun the test suite if cached coverage is stale
     Returns:
-        Dictionary containing various performance metrics
+        Dictionary containing various performance metrics, see
+        calculate_metrics.calculate_metrics
     """
-    # Read the JTL file into a pandas DataFrame
-    df = pd.read_csv(results_file)
-    
-    # Convert timestamp to datetime for better analysis
-    df['timeStamp'] = pd.to_datetime(df['timeStamp'], unit='ms')
-    
-    # Calculate basic metrics
-    total_requests = len(df)
-    successful_requests = len(df[df['responseCode'] == 200])
-    availability = (successful_requests / total_requests) * 100
-    
-    # Calculate reliability (responses under 1000ms threshold)
-    reliable_requests = len(df[(df['responseCode'] == 200) & (df['Latency'] <= 1000)])
-    reliability = (reliable_requests / total_requests) * 100
-    
-    # Try to get code coverage, default to 0 if it fails
-    try:
-        pytest_cmd = ['python', '-m', 'pytest', '--cov=app', 'app/test_api.py']
-        pytest_output = subprocess.run(pytest_cmd, capture_output=True, text=True)
-        coverage_lines = [line for line in pytest_output.stdout.split('\n') if '%' in line]
-        coverage_percent = float(coverage_lines[-1].split()[-1].strip('%')) if coverage_lines else 0
-    except Exception:
-        coverage_percent = 0
-    
-    # Calculate detailed latency metrics
-    latency_metrics = {
-        'avg_latency': df['Latency'].mean(),
-        'max_latency': df['Latency'].max(),
-        'min_latency': df['Latency'].min(),
-        'p95_latency': df['Latency'].quantile(0.95),
-        'p99_latency': df['Latency'].quantile(0.99)
-    }
-    
-    # Calculate throughput (requests per second)
-    duration = (df['timeStamp'].max() - df['timeStamp'].min()).total_seconds()
-    throughput = total_requests / duration if duration > 0 else 0
+    results = calculate_metrics(results_file, chunksize, interval, coverage)
     
     # Generate visualizations
-    create_latency_plot(df)
-    
-    return {
-        'total_requests': total_requests,
-        'successful_requests': successful_requests,
-        'availability': availability,
-        'reliability': reliability,
-        'code_coverage': coverage_percent,
-        'throughput': throughput,
-        **latency_metrics
-    }
+    create_latency_plot(results['by_interval'])
+    return results
 
-def create_latency_plot(df):
+def create_latency_plot(intervals):
     """
     Creates a visualization of latency distribution over time
+    
+    Draws the p50-p99 band of each interval rather than raw samples, so
+    rendering time is bounded by MAX_INTERVALS however long the run was.
     """
     plt.figure(figsize=(10, 6))
-    sns.lineplot(data=df, x='timeStamp', y='Latency')
+    x = intervals.index
+    plt.fill_between(x, intervals['p50'], intervals['p99'], alpha=0.2, label='p50-p99')
+    sns.lineplot(x=x, y=intervals['p50'], label='p50')
+    sns.lineplot(x=x, y=intervals['p95'], label='p95')
     plt.title('Response Latency Over Time')
     plt.xlabel('Time')
     plt.ylabel('Latency (ms)')
@@ -108,14 +76,34 @@ Latency Analysis:
 
 Throughput: {results['throughput']:.2f} requests/second
 
+Per Sampler:
+{format_breakdown(results['by_label'])}
+
 A latency distribution plot has been saved to:
 app/tests/out/plots/latency_distribution.png
 """
     return report
 
+def format_breakdown(summary):
+    """Formats a per-label or per-interval breakdown as a fixed-width table"""
+    return summary.to_string(
+        float_format=lambda value: f"{value:.2f}",
+        header=['requests', 'req/s', 'errors %', 'avg ms', *[f"{name} ms" for name in PERCENTILES]]
+    )
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analyze JMeter results")
+    parser.add_argument("results_file", nargs="?", default="tests/out/results.jtl")
+    parser.add_argument("--chunksize", type=int, help="stream the file in chunks of this many rows")
+    parser.add_argument("--interval", type=int, help="seconds per bucket in the per-interval breakdown")
+    parser.add_argument("--intervals-csv", help="also write the per-interval breakdown to this CSV file")
+    parser.add_argument("--no-coverage", action="store_true", help="report cached coverage only, never rerun the tests")
+    args = parser.parse_args()
+    
     # Analyze results
-    results = analyze_jmeter_results('tests/out/results.jtl')
+    results = analyze_jmeter_results(args.results_file, args.chunksize, args.interval, not args.no_coverage)
+    if args.intervals_csv:
+        results['by_interval'].to_csv(args.intervals_csv)
     
     # Generate and display report
     report = format_results_report(results)
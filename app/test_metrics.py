@@ -6,10 +6,11 @@ import logging
 from datetime import datetime
 from pathlib import Path
 
+from calculate_metrics import COVERAGE_XML, calculate_metrics, record_coverage
+
 class TestMetricsCollector:
     def __init__(self):
         self.results_file = Path("./tests/out/results.jtl")
-        self.coverage_file = Path("./coverage/coverage.txt")
         self.setup_logging()
 
     def setup_logging(self):
@@ -27,41 +28,20 @@ class TestMetricsCollector:
         """Execute all tests and collect metrics"""
         # Run pytest with coverage
         pytest.main([
-            '--cov=app',
+            '--cov=.',
             '--cov-report=html',
             '--cov-report=term-missing',
+            f'--cov-report=xml:{COVERAGE_XML}',
             'tests/',
             '-v'
         ])
+        record_coverage()
 
     def calculate_metrics(self):
         """Calculate performance metrics from test results"""
         try:
-            # Read test results
-            df = pd.read_csv(self.results_file)
-            
-            # Calculate metrics
-            total_requests = len(df)
-            successful_requests = len(df[df['responseCode'] == 200])
-            availability = (successful_requests / total_requests) * 100
-            
-            reliable_requests = len(df[(df['responseCode'] == 200) & (df['Latency'] <= 1000)])
-            reliability = (reliable_requests / total_requests) * 100
-            
-            # Get code coverage
-            coverage = 0
-            if self.coverage_file.exists():
-                with open(self.coverage_file, 'r') as f:
-                    coverage = float(f.read().strip())
-            
-            metrics = {
-                'availability': availability,
-                'reliability': reliability,
-                'code_coverage': coverage,
-                'avg_latency': df['Latency'].mean(),
-                'max_latency': df['Latency'].max()
-            }
-            
+            # Coverage comes from the report run_all_tests cached
+            metrics = calculate_metrics(self.results_file, coverage=False)
             self.display_metrics(metrics)
             return metrics
             
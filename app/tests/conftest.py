@@ -0,0 +1,13 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Point the app at a scratch database before anything imports database.py,
+# so every run starts empty and never writes to ./concerts.db
+_test_dir = tempfile.mkdtemp(prefix="concerts-test-")
+atexit.register(shutil.rmtree, _test_dir, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_dir, 'concerts.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+# Query attribution is opt-in; the API tests check it
+os.environ.setdefault("QUERY_MONITOR", "1")
@@ -1,8 +1,17 @@
+import asyncio
+import sqlite3
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta
-from database import SessionLocal, Concert, UserProfile, init_database
-from main import app
+from sqlalchemy import create_engine, event, text
+from database import SessionLocal, AsyncSessionLocal, engine, async_engine, create_database_engine, get_inventory, place_orders, Concert, ConcertInventory, Ticket, UserProfile, init_database, migrate_database
+from cache import SQLiteAvailabilityCache
+from group_commit import GroupCommitter
+from calculate_metrics import jmeter_metrics
+from load_test import run_load_test
+import main
+from main import app, availability_cache, service_monitor, sweep_expired_reservations, reservation_sweeper_stats
 
 client = TestClient(app)
 
@@ -13,6 +22,8 @@ def test_db():
     db = SessionLocal()
     yield db
     db.close()
+    # Pooled aiosqlite connections run on threads that would keep pytest alive
+    asyncio.run(async_engine.dispose())
 
 @pytest.fixture(scope="module")
 def test_concert(test_db):
@@ -52,6 +63,47 @@ def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
+    assert "hits" in response.json()["metrics"]["caches"]["availability"]
+    assert "wait_p95_ms" in response.json()["metrics"]["pools"]["database_async"]
+
+def test_prometheus_metrics(test_concert):
+    """Test /metrics exports labelled request series in the Prometheus text format"""
+    client.get("/concerts")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'concert_http_requests_total{route="/concerts",method="GET",status="2xx"}' in body
+    assert 'concert_http_request_duration_seconds_bucket{route="/concerts",method="GET",status="2xx",le="+Inf"}' in body
+    # The scrape itself is in flight while the body is rendered
+    assert 'concert_http_requests_in_flight{route="/metrics",method="GET"} 1' in body
+    assert 'concert_cache_hits_total{cache="availability"}' in body
+    assert 'concert_db_pool_checkouts_total{pool="database_async"}' in body
+
+def test_middleware_records_raised_http_errors(test_user):
+    """Test requests answered by an HTTPException are timed under their route template"""
+    key = ("/tickets/confirm/{ticket_id}", "POST", "4xx")
+    before = service_monitor.routes[key].count if key in service_monitor.routes else 0
+    total_before = service_monitor.total_requests
+    
+    response = client.post("/tickets/confirm/999999", params={"user_id": test_user.id})
+    assert response.status_code == 404
+    assert service_monitor.routes[key].count == before + 1
+    assert service_monitor.total_requests == total_before + 1
+
+def test_sql_queries_are_attributed_to_their_route(test_concert, test_user):
+    """Test queries run through the async session are counted against the request's route"""
+    key = ("/tickets/reserve", "POST")
+    before = service_monitor.route_queries[key][0] if key in service_monitor.route_queries else 0
+    response = client.post("/tickets/reserve", json={
+        "concert_id": test_concert.id,
+        "user_id": test_user.id,
+        "quantity": 1,
+        "seat_type": "GENERAL"
+    })
+    assert response.status_code == 200
+    assert service_monitor.route_queries[key][0] > before
+    assert client.get("/health").json()["metrics"]["queries"]["total_queries"] > 0
 
 def test_get_concerts(test_concert):
     """Test retrieving available concerts"""
@@ -146,5 +198,678 @@ def test_concert_filtering(test_concert):
     concerts = response.json()
     assert all(c["min_price"] >= 40.0 for c in concerts)
 
+def test_concert_cursor_pagination(test_db):
+    """Test keyset pagination walks every concert once in (date, id) order"""
+    for days in [5, 3, 3, 9, 1]:
+        test_db.add(Concert(
+            name=f"Jazz in {days} days",
+            artist="Cursor Quartet",
+            date=datetime.now() + timedelta(days=days),
+            venue="Test Venue",
+            genre="CursorJazz",
+            min_price=20.0,
+            capacity=10
+        ))
+    test_db.commit()
+    
+    pages = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get("/concerts", params={"genre": "CursorJazz", "limit": 2, "cursor": cursor})
+        assert response.status_code == 200
+        pages.append([c["id"] for c in response.json()["concerts"]])
+        cursor = response.json()["next_cursor"]
+    
+    offset_order = [
+        c["id"] for c in client.get("/concerts", params={"genre": "CursorJazz", "limit": 10}).json()
+    ]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == offset_order
+    
+    response = client.get("/concerts", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_concert_listing_etag(test_db, test_concert):
+    """Test catalogue pages revalidate with a 304 until concert data changes"""
+    params = {"genre": "Rock"}
+    first = client.get("/concerts", params=params)
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert "max-age" in first.headers["cache-control"]
+    
+    not_modified = client.get("/concerts", params=params, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    
+    # Changing a concert bumps the catalogue version and the page is rebuilt
+    test_concert.description = "Updated description"
+    test_db.commit()
+    changed = client.get("/concerts", params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert any(c["description"] == "Updated description" for c in changed.json())
+
+def create_concert(test_db, capacity=100):
+    """Create a concert of its own so counter assertions are not shared between tests"""
+    concert = Concert(
+        name="Inventory Concert",
+        artist="Test Artist",
+        date=datetime.now() + timedelta(days=30),
+        venue="Test Venue",
+        genre="Rock",
+        min_price=50.0,
+        capacity=capacity,
+        description="Concert used by inventory tests"
+    )
+    test_db.add(concert)
+    test_db.commit()
+    return concert
+
+def get_inventory_counts(concert_id, seat_type):
+    """
+    Read the capacity/reserved/confirmed counters for a concert and seat type.
+
+    A request that failed rolls back the row it backfilled, so a missing row
+    is counted from the tickets like the endpoints do.
+    """
+    db = SessionLocal()
+    try:
+        inventory = get_inventory(db, concert_id, seat_type)
+        return inventory.capacity, inventory.reserved, inventory.confirmed
+    finally:
+        db.close()
+
+def count_visible_tickets(concert_id: int) -> int:
+    """Tickets another connection can see for a concert"""
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT COUNT(*) FROM tickets WHERE concert_id = :concert_id"),
+            {"concert_id": concert_id}
+        ).scalar()
+
+def test_inventory_counters_follow_ticket_lifecycle(test_db, test_user):
+    """Test inventory counters are updated by reserve, confirm, book and cancel"""
+    concert = create_concert(test_db)
+    
+    reserve_response = client.post("/tickets/reserve", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 3,
+        "seat_type": "VIP"
+    })
+    assert reserve_response.status_code == 200
+    assert get_inventory_counts(concert.id, "VIP") == (100, 3, 0)
+    
+    ticket_id = reserve_response.json()["reservation_details"]["tickets"][0]["ticket_id"]
+    client.post(f"/tickets/confirm/{ticket_id}", params={"user_id": test_user.id})
+    assert get_inventory_counts(concert.id, "VIP") == (100, 2, 1)
+    
+    client.post(f"/tickets/cancel/{ticket_id}", params={"user_id": test_user.id})
+    assert get_inventory_counts(concert.id, "VIP") == (100, 2, 0)
+    
+    # Each seat type has its own capacity
+    book_response = client.post("/tickets/book", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 100,
+        "seat_type": "GENERAL"
+    })
+    assert book_response.status_code == 200
+    assert get_inventory_counts(concert.id, "GENERAL") == (100, 100, 0)
+    assert get_inventory_counts(concert.id, "VIP") == (100, 2, 0)
+
+def test_confirm_and_cancel_backfill_inventory_once(test_db, test_user):
+    """Test a row backfilled from already-moved tickets is not adjusted a second time"""
+    concert = create_concert(test_db, capacity=5)
+    tickets = [
+        Ticket(concert_id=concert.id, user_id=test_user.id, status=status, amount=50.0,
+               seat_type=seat_type, booking_time=datetime.now(),
+               reservation_expiry=datetime.now() + timedelta(minutes=15))
+        for status, seat_type in [("RESERVED", "VIP"), ("CONFIRMED", "VIP"), ("CONFIRMED", "GENERAL")]
+    ]
+    test_db.add_all(tickets)
+    test_db.commit()
+    
+    response = client.post(f"/tickets/confirm/{tickets[0].id}", params={"user_id": test_user.id})
+    assert response.status_code == 200
+    assert get_inventory_counts(concert.id, "VIP") == (5, 0, 2)
+    
+    response = client.post(f"/tickets/cancel/{tickets[2].id}", params={"user_id": test_user.id})
+    assert response.status_code == 200
+    assert get_inventory_counts(concert.id, "GENERAL") == (5, 0, 0)
+
+def test_inventory_prevents_overselling(test_db, test_user):
+    """Test a sold out seat type rejects further reservations"""
+    concert = create_concert(test_db, capacity=5)
+    reservation_data = {
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 5,
+        "seat_type": "BACKSTAGE"
+    }
+    
+    assert client.post("/tickets/reserve", json=reservation_data).status_code == 200
+    assert client.post("/tickets/reserve", json=reservation_data).status_code == 400
+    assert get_inventory_counts(concert.id, "BACKSTAGE") == (5, 5, 0)
+
+def test_booking_errors_keep_their_status(test_db, test_user):
+    """Test an unknown concert and a sold out seat type are client errors, not 500s"""
+    concert = create_concert(test_db, capacity=1)
+    booking_data = {
+        "concert_id": concert.id + 100_000,
+        "user_id": test_user.id,
+        "quantity": 2,
+        "seat_type": "VIP"
+    }
+    response = client.post("/tickets/book", json=booking_data)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Concert not found"
+    
+    response = client.post("/tickets/book", json={**booking_data, "concert_id": concert.id})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Not enough tickets available"
+    assert get_inventory_counts(concert.id, "VIP") == (1, 0, 0)
+
+@pytest.mark.parametrize("path", ["/tickets/reserve", "/tickets/book"])
+@pytest.mark.parametrize("quantity", [0, -3])
+def test_non_positive_quantity_is_rejected(test_db, test_user, path, quantity):
+    """Test empty or negative orders fail validation before touching the database"""
+    concert = create_concert(test_db, capacity=5)
+    response = client.post(path, json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": quantity,
+        "seat_type": "GENERAL"
+    })
+    assert response.status_code == 422
+    assert test_db.query(ConcertInventory).filter(ConcertInventory.concert_id == concert.id).count() == 0
+    assert test_db.query(Ticket).filter(Ticket.concert_id == concert.id).count() == 0
+
+def test_bulk_reservation_returns_every_ticket(test_db, test_user):
+    """Test a large multi-quantity reservation creates one row per ticket"""
+    concert = create_concert(test_db, capacity=500)
+    reserve_response = client.post("/tickets/reserve", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 250,
+        "seat_type": "VIP"
+    })
+    assert reserve_response.status_code == 200
+    tickets = reserve_response.json()["reservation_details"]["tickets"]
+    
+    ticket_ids = {t["ticket_id"] for t in tickets}
+    assert len(ticket_ids) == 250
+    assert all(t["amount"] == 125.0 and t["status"] == "RESERVED" for t in tickets)
+    assert test_db.query(Ticket).filter(Ticket.id.in_(ticket_ids)).count() == 250
+
+@pytest.mark.asyncio
+async def test_concurrent_reservations_do_not_block(test_db, test_user):
+    """Test overlapping reservations on the async session path never oversell"""
+    concert = create_concert(test_db, capacity=10)
+    reservation_data = {
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 1,
+        "seat_type": "GENERAL"
+    }
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+        responses = await asyncio.gather(
+            *[async_client.post("/tickets/reserve", json=reservation_data) for _ in range(15)],
+            async_client.get("/health")
+        )
+    
+    reservations = responses[:-1]
+    assert responses[-1].status_code == 200
+    assert sum(1 for r in reservations if r.status_code == 200) == 10
+    assert all(r.status_code in (200, 400) for r in reservations)
+    assert get_inventory_counts(concert.id, "GENERAL") == (10, 10, 0)
+
+@pytest.mark.asyncio
+async def test_concurrent_cancels_release_the_seat_once(test_db, test_user):
+    """Test racing cancels of one ticket succeed once and leave the counters intact"""
+    concert = create_concert(test_db, capacity=5)
+    book_response = client.post("/tickets/book", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 1,
+        "seat_type": "VIP"
+    })
+    ticket_id = book_response.json()[0]["ticket_id"]
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+        responses = await asyncio.gather(*[
+            async_client.post(f"/tickets/cancel/{ticket_id}", params={"user_id": test_user.id})
+            for _ in range(5)
+        ])
+    
+    assert sorted(r.status_code for r in responses) == [200, 409, 409, 409, 409]
+    assert get_inventory_counts(concert.id, "VIP") == (5, 0, 0)
+
+@pytest.mark.asyncio
+async def test_shared_availability_cache_does_not_block_the_loop(tmp_path, monkeypatch):
+    """Test a write waiting on another worker's lock leaves the event loop running"""
+    cache = SQLiteAvailabilityCache(path=str(tmp_path / "availability_cache.db"))
+    cache.set(1, "VIP", 5, version=1)
+    monkeypatch.setattr(main, "availability_cache", cache)
+    other_worker = sqlite3.connect(cache.path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+    # Only fires if the loop keeps running while the write waits
+    asyncio.get_running_loop().call_later(0.2, other_worker.rollback)
+    try:
+        await asyncio.wait_for(main.update_availability_cache(1, "VIP", (4, 2)), 3)
+    finally:
+        other_worker.close()
+    assert cache.get(1, "VIP") == 4
+
+@pytest.mark.asyncio
+async def test_availability_cache_is_written_through(test_db, test_user):
+    """Test mutations keep the cached count equal to the counters without recounting"""
+    concert = create_concert(test_db, capacity=10)
+    booking_data = {
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 1,
+        "seat_type": "BACKSTAGE"
+    }
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+        responses = await asyncio.gather(
+            *[async_client.post("/tickets/book", json=booking_data) for _ in range(15)]
+        )
+        assert sum(1 for r in responses if r.status_code == 200) == 10
+        
+        ticket_id = next(r for r in responses if r.status_code == 200).json()[0]["ticket_id"]
+        cancel_response = await async_client.post(
+            f"/tickets/cancel/{ticket_id}",
+            params={"user_id": test_user.id}
+        )
+        assert cancel_response.status_code == 200
+        assert availability_cache.get(concert.id, "BACKSTAGE") == 1
+        assert get_inventory_counts(concert.id, "BACKSTAGE") == (10, 9, 0)
+        
+        # With the cache warm, a booking never reads the inventory row
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            response = await async_client.post("/tickets/book", json=booking_data)
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    
+    assert response.status_code == 200
+    assert not [s for s in statements if s.lstrip().startswith("SELECT") and "concert_inventory" in s]
+    assert availability_cache.get(concert.id, "BACKSTAGE") == 0
+
+def test_reservation_group_confirm_and_cancel(test_db, test_user):
+    """Test a whole reservation is confirmed and cancelled with one call each"""
+    concert = create_concert(test_db, capacity=10)
+    reserve_response = client.post("/tickets/reserve", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 4,
+        "seat_type": "VIP"
+    })
+    details = reserve_response.json()["reservation_details"]
+    reservation_id = details["reservation_id"]
+    assert all(t["reservation_id"] == reservation_id for t in details["tickets"])
+    
+    # A ticket cancelled on its own is left out of the group confirm
+    ticket_id = details["tickets"][0]["ticket_id"]
+    client.post(f"/tickets/cancel/{ticket_id}", params={"user_id": test_user.id})
+    
+    assert client.post(
+        f"/reservations/{reservation_id}/confirm",
+        params={"user_id": test_user.id + 1}
+    ).status_code == 404
+    confirm_response = client.post(
+        f"/reservations/{reservation_id}/confirm",
+        params={"user_id": test_user.id}
+    )
+    assert confirm_response.status_code == 200
+    assert len(confirm_response.json()["ticket_ids"]) == 3
+    assert get_inventory_counts(concert.id, "VIP") == (10, 0, 3)
+    
+    cancel_response = client.post(
+        f"/reservations/{reservation_id}/cancel",
+        params={"user_id": test_user.id}
+    )
+    assert cancel_response.status_code == 200
+    assert len(cancel_response.json()["ticket_ids"]) == 3
+    assert get_inventory_counts(concert.id, "VIP") == (10, 0, 0)
+    assert availability_cache.get(concert.id, "VIP") == 10
+
+def test_expired_reservation_group_releases_its_seats(test_db, test_user):
+    """Test confirming an expired reservation expires the whole group once"""
+    concert = create_concert(test_db, capacity=5)
+    reserve_response = client.post("/tickets/reserve", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 3,
+        "seat_type": "GENERAL"
+    })
+    reservation_id = reserve_response.json()["reservation_details"]["reservation_id"]
+    test_db.query(Ticket).filter(Ticket.reservation_id == reservation_id).update(
+        {Ticket.reservation_expiry: datetime.now() - timedelta(minutes=1)},
+        synchronize_session=False
+    )
+    test_db.commit()
+    
+    response = client.post(f"/reservations/{reservation_id}/confirm", params={"user_id": test_user.id})
+    assert response.status_code == 400
+    assert get_inventory_counts(concert.id, "GENERAL") == (5, 0, 0)
+    statuses = test_db.query(Ticket.status).filter(Ticket.reservation_id == reservation_id).all()
+    assert [status for status, in statuses] == ["EXPIRED"] * 3
+
+def test_batch_booking_is_all_or_nothing(test_db, test_user):
+    """Test a batch with one unavailable line books nothing by default"""
+    first, second = create_concert(test_db, capacity=5), create_concert(test_db, capacity=5)
+    lines = [
+        {"concert_id": first.id, "user_id": test_user.id, "quantity": 2, "seat_type": "VIP"},
+        {"concert_id": second.id, "user_id": test_user.id, "quantity": 3, "seat_type": "GENERAL"},
+        {"concert_id": second.id, "user_id": test_user.id, "quantity": 3, "seat_type": "GENERAL"}
+    ]
+    
+    response = client.post("/tickets/book/batch", json={"lines": lines})
+    assert response.status_code == 400
+    results = response.json()["detail"]["results"]
+    assert [r["status"] for r in results] == ["FAILED"] * 3
+    assert results[2]["error"] == "Not enough tickets available"
+    assert get_inventory_counts(first.id, "VIP") == (5, 0, 0)
+    
+    response = client.post("/tickets/book/batch", json={"lines": lines[:2]})
+    assert response.status_code == 200
+    assert [len(r["tickets"]) for r in response.json()["results"]] == [2, 3]
+    assert get_inventory_counts(first.id, "VIP") == (5, 2, 0)
+    assert get_inventory_counts(second.id, "GENERAL") == (5, 3, 0)
+
+def test_batch_booking_partial_mode(test_db, test_user):
+    """Test partial mode books every line that fits and reports the others"""
+    concert = create_concert(test_db, capacity=4)
+    response = client.post("/tickets/book/batch", json={
+        "all_or_nothing": False,
+        "lines": [
+            {"concert_id": concert.id, "user_id": test_user.id, "quantity": 3, "seat_type": "BACKSTAGE"},
+            {"concert_id": concert.id + 100_000, "user_id": test_user.id, "quantity": 1, "seat_type": "VIP"},
+            {"concert_id": concert.id, "user_id": test_user.id, "quantity": 2, "seat_type": "BACKSTAGE"},
+            {"concert_id": concert.id, "user_id": test_user.id, "quantity": 1, "seat_type": "BACKSTAGE"}
+        ]
+    })
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["BOOKED", "FAILED", "FAILED", "BOOKED"]
+    assert results[1]["error"] == "Concert not found"
+    assert availability_cache.get(concert.id, "BACKSTAGE") == 0
+    assert get_inventory_counts(concert.id, "BACKSTAGE") == (4, 4, 0)
+
+@pytest.mark.asyncio
+async def test_partial_batch_is_rolled_back_as_one_transaction(test_db, test_user):
+    """Test lines placed behind savepoints stay invisible and roll back together"""
+    concert = create_concert(test_db, capacity=4)
+    ticket_fields = {
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "status": "RESERVED",
+        "amount": 50.0,
+        "seat_type": "VIP",
+        "booking_time": datetime.now()
+    }
+    orders = [
+        (concert.id, "VIP", 2, ticket_fields),
+        (concert.id, "VIP", 5, ticket_fields),
+        (concert.id, "VIP", 1, ticket_fields)
+    ]
+    
+    async with AsyncSessionLocal() as db:
+        results = await db.run_sync(place_orders, orders, False)
+        assert [len(r[0]) if r else None for r in results] == [2, None, 1]
+        assert count_visible_tickets(concert.id) == 0
+        await db.rollback()
+    assert count_visible_tickets(concert.id) == 0
+    assert get_inventory_counts(concert.id, "VIP") == (4, 0, 0)
+
+@pytest.mark.asyncio
+async def test_group_commit_applies_orders_in_one_transaction(test_db, test_user):
+    """Test queued orders share a commit, see each other's holds and fail individually"""
+    concert = create_concert(test_db, capacity=10)
+    committer = GroupCommitter(AsyncSessionLocal, max_batch=5, max_delay=1)
+    ticket_fields = {
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "status": "RESERVED",
+        "amount": 50.0,
+        "seat_type": "GENERAL",
+        "booking_time": datetime.now()
+    }
+    
+    results = await asyncio.gather(*[
+        committer.submit(concert.id, "GENERAL", 3, ticket_fields) for _ in range(4)
+    ], committer.submit(concert.id + 100_000, "GENERAL", 1, ticket_fields))
+    await committer.close()
+    
+    assert [len(r[0]) if r else None for r in results] == [3, 3, 3, None, None]
+    assert results[2][1] == (1, 3)  # (available, version) after the third order
+    assert committer.stats()["batches"] == 1
+    assert get_inventory_counts(concert.id, "GENERAL") == (10, 9, 0)
+
+@pytest.mark.asyncio
+async def test_group_commit_orders_stay_invisible_until_commit(test_db, test_user):
+    """Test releasing an order's savepoint does not commit it on SQLite"""
+    concert = create_concert(test_db, capacity=10)
+    committer = GroupCommitter(AsyncSessionLocal, max_batch=3, max_delay=1)
+    ticket_fields = {
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "status": "RESERVED",
+        "amount": 50.0,
+        "seat_type": "GENERAL",
+        "booking_time": datetime.now()
+    }
+    seen = []
+    
+    def before_release(conn, name, context):
+        seen.append(count_visible_tickets(concert.id))
+    
+    def before_commit(conn):
+        seen.append(count_visible_tickets(concert.id))
+    
+    event.listen(async_engine.sync_engine, "release_savepoint", before_release)
+    event.listen(async_engine.sync_engine, "commit", before_commit)
+    try:
+        await asyncio.gather(*[
+            committer.submit(concert.id, "GENERAL", 1, ticket_fields) for _ in range(3)
+        ])
+        await committer.close()
+    finally:
+        event.remove(async_engine.sync_engine, "release_savepoint", before_release)
+        event.remove(async_engine.sync_engine, "commit", before_commit)
+    
+    assert seen and not any(seen)
+    assert count_visible_tickets(concert.id) == 3
+
+@pytest.mark.asyncio
+async def test_group_commit_close_leaves_no_caller_waiting(test_db, test_user):
+    """Test close commits queued orders, or fails them once its timeout runs out"""
+    concert = create_concert(test_db, capacity=10)
+    ticket_fields = {
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "status": "RESERVED",
+        "amount": 50.0,
+        "seat_type": "GENERAL",
+        "booking_time": datetime.now()
+    }
+    
+    # Closing drains the queue without waiting out max_delay
+    committer = GroupCommitter(AsyncSessionLocal, max_batch=5, max_delay=60)
+    orders = [asyncio.create_task(committer.submit(concert.id, "GENERAL", 1, ticket_fields)) for _ in range(2)]
+    await asyncio.sleep(0)
+    await asyncio.wait_for(committer.close(), 5)
+    assert [len((await order)[0]) for order in orders] == [1, 1]
+    with pytest.raises(RuntimeError):
+        await committer.submit(concert.id, "GENERAL", 1, ticket_fields)
+    
+    # Orders that cannot be committed in time get an error instead of hanging
+    committer = GroupCommitter(AsyncSessionLocal, max_batch=5, max_delay=60)
+    orders = [asyncio.create_task(committer.submit(concert.id, "GENERAL", 1, ticket_fields)) for _ in range(2)]
+    await asyncio.sleep(0)
+    await committer.close(timeout=0)
+    for order in orders:
+        with pytest.raises(RuntimeError):
+            await order
+    assert get_inventory_counts(concert.id, "GENERAL") == (10, 2, 0)
+
+@pytest.mark.asyncio
+async def test_sweeper_reclaims_expired_reservations(test_db, test_user):
+    """Test the background sweep expires due holds in batches and frees their seats"""
+    concert = create_concert(test_db, capacity=5)
+    reserve_response = client.post("/tickets/reserve", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 5,
+        "seat_type": "VIP"
+    })
+    ticket_ids = [t["ticket_id"] for t in reserve_response.json()["reservation_details"]["tickets"]]
+    
+    # Let three of the five holds run out
+    test_db.query(Ticket).filter(Ticket.id.in_(ticket_ids[:3])).update(
+        {Ticket.reservation_expiry: datetime.now() - timedelta(minutes=1)},
+        synchronize_session=False
+    )
+    test_db.commit()
+    
+    assert await sweep_expired_reservations(batch_size=2) == 3
+    assert reservation_sweeper_stats["last_reclaimed"] == 3
+    assert get_inventory_counts(concert.id, "VIP") == (5, 2, 0)
+    statuses = dict(test_db.query(Ticket.id, Ticket.status).filter(Ticket.id.in_(ticket_ids)).all())
+    assert [statuses[i] for i in ticket_ids] == ["EXPIRED"] * 3 + ["RESERVED"] * 2
+    
+    # The reclaimed seats can be sold again
+    assert client.post("/tickets/reserve", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 3,
+        "seat_type": "VIP"
+    }).status_code == 200
+
+@pytest.mark.asyncio
+async def test_sweeper_skips_orphaned_reservations(test_db, test_user):
+    """Test an expired hold of a deleted concert does not block the rest of the sweep"""
+    concert = create_concert(test_db, capacity=5)
+    reserve_response = client.post("/tickets/reserve", json={
+        "concert_id": concert.id,
+        "user_id": test_user.id,
+        "quantity": 1,
+        "seat_type": "GENERAL"
+    })
+    ticket_id = reserve_response.json()["reservation_details"]["tickets"][0]["ticket_id"]
+    orphan = Ticket(
+        concert_id=concert.id + 100_000,
+        user_id=test_user.id,
+        seat_type="GENERAL",
+        status="RESERVED",
+        amount=50.0,
+        booking_time=datetime.now(),
+        reservation_expiry=datetime.now() - timedelta(minutes=1)
+    )
+    test_db.add(orphan)
+    test_db.query(Ticket).filter(Ticket.id == ticket_id).update(
+        {Ticket.reservation_expiry: datetime.now() - timedelta(minutes=1)},
+        synchronize_session=False
+    )
+    test_db.commit()
+    
+    assert await sweep_expired_reservations() == 1
+    assert get_inventory_counts(concert.id, "GENERAL") == (5, 0, 0)
+    test_db.refresh(orphan)
+    assert orphan.status == "EXPIRED"
+
+def test_sqlite_engine_uses_wal_and_pragmas(tmp_path):
+    """Test the engine factory configures every SQLite connection and times checkouts"""
+    file_engine = create_database_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    try:
+        with file_engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+        assert file_engine.pool.stats()["checkouts"] == 1
+    finally:
+        file_engine.dispose()
+
+def test_migration_adds_indexes_and_keeps_data(tmp_path):
+    """Test migrate_database upgrades an existing database without wiping it"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE concerts (id INTEGER PRIMARY KEY, name VARCHAR, artist VARCHAR, "
+            "date DATETIME, venue VARCHAR, genre VARCHAR, min_price FLOAT, capacity INTEGER, "
+            "description VARCHAR, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE tickets (id INTEGER PRIMARY KEY, concert_id INTEGER, user_id INTEGER, "
+            "seat_type VARCHAR NOT NULL, status VARCHAR NOT NULL, amount FLOAT NOT NULL, "
+            "booking_time DATETIME, reservation_expiry DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO concerts (id, name, capacity, min_price) VALUES (1, 'Legacy', 50, 10.0)"))
+        conn.execute(text(
+            "INSERT INTO tickets (concert_id, user_id, seat_type, status, amount) VALUES "
+            "(1, 1, 'VIP', 'RESERVED', 25.0), (1, 2, 'VIP', 'CONFIRMED', 25.0), (1, 3, 'VIP', 'CANCELLED', 25.0)"
+        ))
+        # Created by an earlier version of the schema
+        conn.execute(text("CREATE INDEX ix_tickets_id_user_status ON tickets (id, user_id, status)"))
+    
+    result = migrate_database(bind=engine)
+    assert {"ix_tickets_concert_seat_status", "ix_tickets_user_status"} <= set(result["indexes"])
+    assert result["dropped_indexes"] == ["ix_tickets_id_user_status"]
+    assert migrate_database(bind=engine) == {
+        "columns": [], "indexes": [], "dropped_indexes": [], "inventory_rows": 0
+    }
+    
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM tickets")).scalar() == 3
+        inventory = conn.execute(text(
+            "SELECT capacity, reserved, confirmed FROM concert_inventory "
+            "WHERE concert_id = 1 AND seat_type = 'VIP'"
+        )).one()
+    assert tuple(inventory) == (50, 1, 1)
+    engine.dispose()
+
+@pytest.mark.asyncio
+async def test_load_test_writes_jtl_for_every_flow(test_db, test_user, tmp_path):
+    """Test both load modes drive the booking flows in-process and write readable JTL"""
+    concert = create_concert(test_db, capacity=1000)
+    target = {"concert_id": concert.id, "user_id": test_user.id}
+    closed, opened = tmp_path / "closed.jtl", tmp_path / "open.jtl"
+    
+    results = await run_load_test(
+        output=closed, users=3, iterations=3, target=target, lifespan=False
+    )
+    assert results == {"samples": 15, "errors": 0}
+    metrics = jmeter_metrics(closed)
+    assert metrics["availability"] == 100
+    assert set(metrics["by_label"].index) == {
+        "Get Concerts", "Reserve Tickets", "Confirm Reservation", "Book Tickets", "Cancel Ticket"
+    }
+    # Booked tickets were cancelled and reservations confirmed
+    assert get_inventory_counts(concert.id, "GENERAL") == (1000, 0, 3)
+    
+    results = await run_load_test(
+        output=opened, mode="open", rate=200, iterations=4,
+        scenarios=["book_cancel"], target=target, lifespan=False
+    )
+    assert results == {"samples": 8, "errors": 0}
+    
+    # Requests that never reach a server are failed samples, not crashes
+    results = await run_load_test(
+        output=opened, iterations=1, users=1, scenarios=["browse"],
+        base_url="http://127.0.0.1:9", target=target
+    )
+    assert results == {"samples": 1, "errors": 1}
+    assert "Non HTTP response code: ConnectError" in opened.read_text()
+
 if __name__ == "__main__":
     pytest.main(["-v"])
\ No newline at end of file
@@ -0,0 +1,143 @@
+import multiprocessing
+
+import pytest
+from cache import MemoryAvailabilityCache, SQLiteAvailabilityCache, create_availability_cache
+
+def cache_worker(path, commands, replies):
+    """Worker process holding its own SQLiteAvailabilityCache on a shared file"""
+    cache = SQLiteAvailabilityCache(path=path, ttl=60)
+    for method, args in iter(commands.get, None):
+        replies.put(getattr(cache, method)(*args))
+
+class Worker:
+    """Drives a cache_worker process the way a uvicorn worker would use its cache"""
+
+    def __init__(self, context, path):
+        self.commands = context.Queue()
+        self.replies = context.Queue()
+        self.process = context.Process(target=cache_worker, args=(path, self.commands, self.replies))
+        self.process.start()
+
+    def call(self, method, *args):
+        self.commands.put((method, args))
+        return self.replies.get(timeout=30)
+
+    def stop(self):
+        self.commands.put(None)
+        self.process.join(timeout=30)
+
+@pytest.fixture
+def workers(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    path = str(tmp_path / "availability_cache.db")
+    started = [Worker(context, path) for _ in range(3)]
+    yield started
+    for worker in started:
+        worker.stop()
+
+def test_invalidation_reaches_every_worker(workers):
+    """Test a count cached by one worker is shared, and dropped everywhere on invalidation"""
+    first, second, third = workers
+    stamp = first.call("stamp", 1)
+    first.call("set", 1, "VIP", 42, stamp)
+    first.call("set", 12, "VIP", 7, first.call("stamp", 12))
+    
+    assert second.call("get", 1, "VIP") == 42
+    assert third.call("get", 1, "VIP") == 42
+    
+    second.call("invalidate_concert", 1)
+    
+    assert first.call("get", 1, "VIP") is None
+    assert third.call("get", 1, "VIP") is None
+    # concert_12 is not mistaken for concert_1
+    assert third.call("get", 12, "VIP") == 7
+
+def test_stale_fill_is_discarded_across_workers(workers):
+    """Test a count read before another worker's invalidation is never served"""
+    first, second, _ = workers
+    stamp = first.call("stamp", 1)
+    second.call("invalidate_concert", 1)
+    first.call("set", 1, "GENERAL", 10, stamp)
+    
+    assert second.call("get", 1, "GENERAL") is None
+    assert first.call("get", 1, "GENERAL") is None
+
+def test_memory_cache_discards_stale_fill():
+    """Test the per-process cache applies the same stamp rule"""
+    cache = MemoryAvailabilityCache(ttl=60)
+    stamp = cache.stamp(1)
+    cache.invalidate_concert(1)
+    cache.set(1, "VIP", 10, stamp)
+    assert cache.get(1, "VIP") is None
+    
+    cache.set(1, "VIP", 10, cache.stamp(1))
+    assert cache.get(1, "VIP") == 10
+
+def test_unknown_backend_is_rejected():
+    """Test configuration errors surface at startup"""
+    with pytest.raises(ValueError):
+        create_availability_cache(backend="redis")
+
+def test_memory_cache_evicts_least_recently_used():
+    """Test the memory cache stays within max_entries and counts evictions"""
+    cache = MemoryAvailabilityCache(ttl=60, max_entries=2)
+    cache.set(1, "VIP", 10, cache.stamp(1))
+    cache.set(2, "VIP", 20, cache.stamp(2))
+    assert cache.get(1, "VIP") == 10  # concert 1 is now the most recent
+    cache.set(3, "VIP", 30, cache.stamp(3))
+    
+    assert cache.get(2, "VIP") is None
+    assert cache.get(1, "VIP") == 10
+    assert cache.get(3, "VIP") == 30
+    stats = cache.stats()
+    assert (stats["size"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+def test_memory_cache_expires_entries():
+    """Test entries older than the TTL are no longer served"""
+    cache = MemoryAvailabilityCache(ttl=-1)
+    cache.set(1, "VIP", 10, cache.stamp(1))
+    assert cache.get(1, "VIP") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+def test_memory_cache_invalidates_only_one_concert():
+    """Test invalidating concert 1 drops all its seat types and leaves concert 12 alone"""
+    cache = MemoryAvailabilityCache(ttl=60)
+    for concert_id in (1, 12):
+        for seat_type in ("GENERAL", "VIP", "BACKSTAGE"):
+            cache.set(concert_id, seat_type, concert_id, cache.stamp(concert_id))
+    
+    cache.invalidate_concert(1)
+    
+    assert all(cache.get(1, seat_type) is None for seat_type in ("GENERAL", "VIP", "BACKSTAGE"))
+    assert all(cache.get(12, seat_type) == 12 for seat_type in ("GENERAL", "VIP", "BACKSTAGE"))
+    assert cache.stats()["size"] == 3
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_cache_keeps_newest_inventory_version(backend, tmp_path):
+    """Test a late write-through or fill never replaces a newer count"""
+    cache = create_availability_cache(backend=backend, ttl=60, path=str(tmp_path / "availability_cache.db"))
+    stamp = cache.stamp(1)
+    cache.set(1, "VIP", 8, version=2)
+    cache.set(1, "VIP", 9, version=1)
+    cache.set(1, "VIP", 10, stamp, version=0)
+    assert cache.get(1, "VIP") == 8
+    
+    cache.set(1, "VIP", 7, version=3)
+    assert cache.get(1, "VIP") == 7
+
+def test_sqlite_cache_purges_expired_and_excess_rows(tmp_path):
+    """Test the shared cache stays within max_entries and reports what it dropped"""
+    cache = SQLiteAvailabilityCache(path=str(tmp_path / "availability_cache.db"), ttl=60, max_entries=3)
+    cache.PURGE_INTERVAL = 1
+    for concert_id in range(1, 6):
+        cache.set(concert_id, "VIP", concert_id, version=1)
+    
+    stats = cache.stats()
+    assert (stats["size"], stats["max_entries"], stats["evictions"]) == (3, 3, 2)
+    assert cache.get(1, "VIP") is None
+    assert cache.get(5, "VIP") == 5
+    
+    cache.ttl = -1
+    cache.set(6, "VIP", 6, version=1)
+    assert cache.stats()["expirations"] == 1
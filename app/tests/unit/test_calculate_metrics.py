@@ -0,0 +1,118 @@
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+import calculate_metrics
+from calculate_metrics import MAX_INTERVALS, code_coverage, jmeter_metrics, latency_histogram, record_coverage
+
+RESULTS = os.path.join(os.path.dirname(__file__), "..", "out", "results.jtl")
+
+def test_streaming_matches_in_memory_analysis():
+    """Test chunked ingestion gives the same counts and close percentiles"""
+    full = jmeter_metrics(RESULTS)
+    streamed = jmeter_metrics(RESULTS, chunksize=7)
+    for key in ["total_requests", "successful_requests", "availability", "reliability",
+                "throughput", "avg_latency", "min_latency", "max_latency"]:
+        assert streamed[key] == pytest.approx(full[key])
+    for key in ["p95_latency", "p99_latency"]:
+        assert streamed[key] == pytest.approx(full[key], rel=0.05)
+
+def test_histogram_quantiles_and_merge():
+    """Test percentiles stay within the bucket growth and merging adds counts"""
+    latencies = np.arange(1, 10_001)
+    first, second = latency_histogram(), latency_histogram()
+    first.record_all(latencies[:5000])
+    second.record_all(latencies[5000:])
+    first.merge(second)
+    assert sum(first.counts.values()) == first.total == 10_000
+    assert first.percentile(0.5) == pytest.approx(5000, rel=0.01)
+    assert first.percentile(0.99) == pytest.approx(9900, rel=0.01)
+    assert (first.min, first.max) == (1, 10_000)
+
+def test_breakdowns_per_label_and_interval():
+    """Test both paths break the run down the same way"""
+    full = jmeter_metrics(RESULTS)
+    streamed = jmeter_metrics(RESULTS, chunksize=7)
+    for result in (full, streamed):
+        by_label = result["by_label"]
+        assert list(by_label.index) == ["Get Concerts"]
+        assert by_label.loc["Get Concerts", "requests"] == 100
+        assert by_label.loc["Get Concerts", "error_rate"] == 0
+        assert result["by_interval"]["requests"].sum() == 100
+        assert len(result["by_interval"]) <= MAX_INTERVALS
+    assert list(full["by_interval"].index) == list(streamed["by_interval"].index)
+    assert streamed["by_label"]["p50"].iloc[0] == pytest.approx(full["by_label"]["p50"].iloc[0], rel=0.01)
+
+    by_second = jmeter_metrics(RESULTS, interval=1)["by_interval"]
+    assert (by_second["throughput"] == by_second["requests"]).all()
+
+def test_long_streamed_run_folds_into_report_intervals(tmp_path):
+    """Test a run much longer than MAX_INTERVALS seconds streams into the same intervals"""
+    results = tmp_path / "results.jtl"
+    start = 1_733_278_053_662
+    with open(results, "w") as f:
+        f.write("timeStamp,label,responseCode,Latency\n")
+        for i in range(3000):
+            f.write(f"{start + i * 7_000},Get Concerts,{200 if i % 10 else 500},{i % 97 + 1}\n")
+    full = jmeter_metrics(str(results))
+    streamed = jmeter_metrics(str(results), chunksize=50)
+
+    assert len(streamed["by_interval"]) <= MAX_INTERVALS
+    assert list(streamed["by_interval"].index) == list(full["by_interval"].index)
+    for column in ["requests", "throughput", "error_rate", "avg_latency"]:
+        assert list(streamed["by_interval"][column]) == pytest.approx(list(full["by_interval"][column]))
+
+def write_report(path, line_rate, mtime):
+    path.write_text(f'<?xml version="1.0" ?><coverage line-rate="{line_rate}"></coverage>')
+    os.utime(path, ns=(mtime, mtime))
+
+def test_coverage_is_cached_per_tree_and_report(tmp_path, monkeypatch):
+    """Test the suite only reruns when the source tree changes"""
+    xml_path, cache_path = tmp_path / "coverage.xml", tmp_path / "cache.json"
+    tree = ["tree-1"]
+    runs = []
+
+    def run_coverage(path):
+        runs.append(path)
+        write_report(path, 0.8, len(runs))
+
+    monkeypatch.setattr(calculate_metrics, "source_tree_hash", lambda: tree[0])
+    monkeypatch.setattr(calculate_metrics, "run_coverage", run_coverage)
+    measure = lambda run=True: code_coverage(run, xml_path, cache_path)
+
+    assert measure() == pytest.approx(80)
+    assert measure() == pytest.approx(80)
+    assert len(runs) == 1
+
+    # A report rewritten for the same tree is read without running the tests
+    write_report(xml_path, 0.9, 100)
+    assert measure() == pytest.approx(90)
+    assert len(runs) == 1
+
+    tree[0] = "tree-2"
+    assert measure(run=False) == 0
+    assert measure() == pytest.approx(80)
+    assert len(runs) == 2
+
+def test_rewritten_results_keep_cached_coverage(tmp_path, monkeypatch):
+    """Test only Python source changes invalidate the cached coverage"""
+    if not shutil.which("git"):
+        pytest.skip("git is not installed")
+    (tmp_path / "main.py").write_text("x = 1\n")
+    (tmp_path / "results.jtl").write_text("timeStamp,elapsed\n")
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run(["git", "add", "."], cwd=tmp_path, check=True)
+    monkeypatch.setattr(calculate_metrics, "APP_DIR", tmp_path)
+    xml_path, cache_path = tmp_path / "coverage.xml", tmp_path / "cache.json"
+    write_report(xml_path, 0.93, 1)
+    record_coverage(xml_path=xml_path, cache_path=cache_path)
+
+    with open(tmp_path / "results.jtl", "a") as f:
+        f.write("1733278053662,89\n")
+    assert code_coverage(False, xml_path, cache_path) == pytest.approx(93)
+
+    (tmp_path / "main.py").write_text("x = 2\n")
+    assert code_coverage(False, xml_path, cache_path) == 0
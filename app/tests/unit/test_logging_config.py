@@ -0,0 +1,87 @@
+import json
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+import logging_config
+from logging_config import DatedFileHandler, bind_request, configure_logging, unbind_request
+
+class Route:
+    path = "/tickets/confirm/{ticket_id}"
+
+@pytest.fixture
+def log_to(tmp_path):
+    """Configure queued logging into a scratch file and return a reader for its lines"""
+    listeners = []
+
+    def configure(**options):
+        path = tmp_path / "app.log"
+        listeners.append(configure_logging(str(path), **options))
+
+        def read_lines():
+            listeners[-1].stop()  # Drains the queue
+            return path.read_text().splitlines()
+        return read_lines
+
+    yield configure
+    logging.getLogger().removeHandler(logging_config._queue_handler)
+
+def test_json_lines_carry_request_context(log_to):
+    """Test records logged inside a request are written as JSON with its id and route"""
+    read_lines = log_to(json_format=True)
+    token = bind_request("req-1", {"route": Route})
+    try:
+        logging.getLogger("booking").info("Confirmed %s tickets", 3, extra={"latency_ms": 1.5})
+    finally:
+        unbind_request(token)
+    logging.getLogger("booking").warning("Outside any request")
+
+    inside, outside = [json.loads(line) for line in read_lines()]
+    assert inside["message"] == "Confirmed 3 tickets"
+    assert inside["request_id"] == "req-1"
+    assert inside["route"] == "/tickets/confirm/{ticket_id}"
+    assert inside["latency_ms"] == 1.5
+    assert outside["level"] == "WARNING"
+    assert "request_id" not in outside
+
+def test_tracebacks_cross_the_queue_as_their_own_field(log_to):
+    """Test JSON lines keep the traceback under "exception", apart from the message"""
+    read_lines = log_to(json_format=True)
+    try:
+        raise ValueError("sold out")
+    except ValueError:
+        logging.getLogger("booking").exception("Error booking %s tickets", 2)
+
+    entry, = [json.loads(line) for line in read_lines()]
+    assert entry["message"] == "Error booking 2 tickets"
+    assert entry["exception"].startswith("Traceback (most recent call last)")
+    assert entry["exception"].endswith("ValueError: sold out")
+
+def test_sampling_drops_only_marked_success_lines(log_to):
+    """Test a zero sample rate drops sampled lines but keeps everything else"""
+    read_lines = log_to(sample_rate=0)
+    logger = logging.getLogger("booking")
+    for i in range(100):
+        logger.info(f"Successfully retrieved {i} concerts", extra={"sample": True})
+    logger.info("Reservation sweep reclaimed 2 expired tickets")
+    logger.error("Error booking tickets", extra={"sample": True})
+
+    lines = read_lines()
+    assert len(lines) == 2
+    assert lines[0].endswith("INFO - Reservation sweep reclaimed 2 expired tickets")
+    assert lines[1].endswith("ERROR - Error booking tickets")
+
+def test_dated_file_moves_to_the_next_day(tmp_path):
+    """Test records logged after midnight go to the next day's file"""
+    pattern = str(tmp_path / "app_%Y_%m_%d.log")
+    handler = DatedFileHandler(pattern)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    today = datetime.now()
+    tomorrow = today + timedelta(days=1)
+    for created, message in [(today, "before midnight"), (tomorrow, "after midnight")]:
+        record = logging.makeLogRecord({"msg": message, "created": created.timestamp()})
+        handler.handle(record)
+    handler.close()
+
+    assert (tmp_path / today.strftime("app_%Y_%m_%d.log")).read_text() == "before midnight\n"
+    assert (tmp_path / tomorrow.strftime("app_%Y_%m_%d.log")).read_text() == "after midnight\n"
@@ -0,0 +1,68 @@
+import random
+
+import monitoring
+from monitoring import LatencyHistogram, ServiceMonitor
+
+class Clock:
+    """Stands in for time.time() so tests can move through the window"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_histogram_percentiles_stay_within_relative_error():
+    """Test percentiles from the histogram match the exact ones within its bucket growth"""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(-4, 1) for _ in range(20_000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(histogram.percentile(q) - exact) / exact < 0.03
+    assert histogram.percentile(1.0) == values[-1]
+    assert len(histogram.counts) < 1000
+
+def test_merged_histograms_match_one_histogram():
+    """Test merging per-bucket histograms gives the same counts as recording into one"""
+    combined, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i in range(1, 500):
+        combined.record(i / 1000)
+        (first if i % 2 else second).record(i / 1000)
+    first.merge(second)
+
+    assert first.counts == combined.counts
+    assert first.total == combined.total
+    assert (first.min, first.max) == (combined.min, combined.max)
+
+def test_monitor_keeps_fixed_memory_and_drops_old_buckets(monkeypatch):
+    """Test old requests leave the window as the ring wraps around"""
+    clock = Clock()
+    monkeypatch.setattr(monitoring.time, "time", clock)
+    monitor = ServiceMonitor(window_size=3600, bucket_seconds=10)
+
+    for _ in range(100):
+        monitor.record_request(duration=0.5, success=False)
+    clock.now += 600
+    for i in range(100):
+        monitor.record_request(duration=(i + 1) / 1000, success=True)
+
+    metrics = monitor.get_metrics()
+    assert len(monitor._buckets) == 360
+    assert metrics["total_requests"] == 200
+    assert metrics["failed_requests"] == 100
+    assert metrics["requests_last_hour"] == 200
+    # Only the last five minutes count towards availability and latency
+    assert metrics["availability"] == 100.0
+    assert abs(metrics["latency_p50"] - 0.050) < 0.002
+    assert abs(metrics["latency_p99"] - 0.099) < 0.003
+    assert metrics["latency_p50"] <= metrics["latency_p90"] <= metrics["latency_p95"] <= metrics["latency_p99"]
+
+    clock.now += 3600
+    metrics = monitor.get_metrics()
+    assert metrics["requests_last_hour"] == 0
+    assert metrics["latency_p99"] == 0
@@ -0,0 +1,79 @@
+import asyncio
+
+from sqlalchemy import create_engine, text
+
+from monitoring import ServiceMonitor, TimingMiddleware
+from query_monitor import QueryMonitor, normalize_statement
+
+class Route:
+    """Stands in for the route FastAPI's router stores in the scope"""
+    path = "/tickets/{ticket_id}"
+
+def call_app(app):
+    """Send one GET through an ASGI app and return the messages it sent"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({"type": "http", "method": "GET", "path": "/tickets/1", "headers": []}, receive, send))
+    return sent
+
+def test_normalize_statement_groups_queries_by_shape():
+    """Test values, placeholder styles and IN-list lengths normalize away"""
+    assert normalize_statement("SELECT *\n  FROM tickets WHERE id = 42 AND status = 'RESERVED'") == \
+        "SELECT * FROM tickets WHERE id = ? AND status = ?"
+    assert normalize_statement("SELECT * FROM tickets WHERE id IN (?, ?, ?)") == \
+        normalize_statement("SELECT * FROM tickets WHERE id IN ($1, $2)") == \
+        "SELECT * FROM tickets WHERE id IN (...)"
+    assert normalize_statement("SELECT anon_1.id FROM t1 AS anon_1") == "SELECT anon_1.id FROM t1 AS anon_1"
+
+def test_middleware_attributes_queries_and_flags_duplicates(caplog):
+    """Test a request's queries reach its route totals, debug headers and the N+1 detector"""
+    engine = create_engine("sqlite://")
+    query_monitor = QueryMonitor(slow_query_threshold=10, duplicate_threshold=3)
+    query_monitor.instrument(engine)
+    monitor = ServiceMonitor()
+    monitor.register_query_monitor(query_monitor)
+
+    async def endpoint(scope, receive, send):
+        scope["route"] = Route
+        with engine.connect() as conn:
+            for ticket_id in range(4):
+                conn.execute(text("SELECT :id"), {"id": ticket_id})
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    app = TimingMiddleware(endpoint, monitor, query_monitor=query_monitor, debug_headers=True)
+    with caplog.at_level("WARNING", logger="query_monitor"):
+        sent = call_app(app)
+
+    headers = dict(sent[0]["headers"])
+    assert headers[b"x-db-query-count"] == b"4"
+    assert float(headers[b"x-db-query-time-ms"]) > 0
+    assert monitor.route_queries[("/tickets/{ticket_id}", "GET")][0] == 4
+    assert query_monitor.stats()["duplicate_queries"] == 1
+    assert "Query ran 4 times in one /tickets/{ticket_id} request: SELECT ?" in caplog.text
+
+    # Queries outside a request count towards the totals only
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert query_monitor.stats()["total_queries"] == 5
+    assert monitor.route_queries[("/tickets/{ticket_id}", "GET")][0] == 4
+    engine.dispose()
+
+def test_slow_queries_are_logged_normalized(caplog):
+    """Test statements over the threshold are logged and kept without their values"""
+    engine = create_engine("sqlite://")
+    query_monitor = QueryMonitor(slow_query_threshold=0)
+    query_monitor.instrument(engine)
+    with caplog.at_level("WARNING", logger="query_monitor"), engine.connect() as conn:
+        conn.execute(text("SELECT 'secret', 7"))
+
+    assert query_monitor.stats()["slow_queries"] == 1
+    assert query_monitor.stats()["recent_slow_queries"][0]["statement"] == "SELECT ?, ?"
+    assert "secret" not in caplog.text
+    engine.dispose()
@@ -0,0 +1,164 @@
+import datetime
+import gzip
+import json
+import os
+
+from searchLogs import analyze_chunk, analyze_files, analyze_incremental, find_log_files, main
+
+LINES = [
+    "2026-10-16 23:59:58,001 - INFO - Successfully retrieved 3 concerts",
+    "2026-10-17 09:00:01,002 - INFO - HTTP Request: GET http://testserver/concerts \"HTTP/1.1 200 OK\"",
+    "2026-10-17 09:15:00,003 - INFO - Successfully retrieved 12 concerts",
+    "2026-10-17 09:30:00,004 - INFO - Successfully confirmed ticket 7",
+    "2026-10-17 10:00:00,005 - ERROR - Error confirming ticket: boom",
+    "Traceback (most recent call last): ERROR while handling",
+    '{"time": "2026-10-17T10:45:00.006", "level": "INFO", "logger": "root", "message": "Successfully cancelled ticket 7"}',
+]
+
+def write_logs(tmp_path, copies=50):
+    """One plain and one gzipped log holding the same lines"""
+    text = "\n".join(LINES * copies) + "\n"
+    plain = tmp_path / "concert_booking_17_10_2026.log"
+    plain.write_text(text)
+    rotated = tmp_path / "concert_booking_16_10_2026.log.gz"
+    with gzip.open(rotated, "wt") as f:
+        f.write(text)
+    return str(plain), str(rotated)
+
+def test_chunks_count_every_line_once(tmp_path):
+    """Test small chunks split mid-line give the same totals as a single pass"""
+    plain, rotated = write_logs(tmp_path)
+    single, single_hourly = analyze_chunk((rotated, 0, None))
+
+    metrics, hourly = analyze_files([plain, rotated], workers=2, chunk_size=997)
+    assert metrics == {key: value * 2 for key, value in single.items()}
+    assert single == {
+        "retrievals": 100, "confirmations": 50, "cancellations": 50,
+        "requests": 50, "errors": 100, "total_concerts": 750
+    }
+    assert hourly[(b"2026-10-17", b"09")]["retrievals"] == 100
+    # The traceback line counts towards the hour of the line before it
+    assert single_hourly[(b"2026-10-17", b"10")]["errors"] == 100
+
+def test_date_range_filters_lines(tmp_path):
+    """Test only lines inside the inclusive date range are counted"""
+    plain, rotated = write_logs(tmp_path, copies=1)
+    day = datetime.date(2026, 10, 17)
+    metrics, hourly = analyze_files([plain, rotated], date_from=day, date_to=day, workers=1)
+    assert metrics["retrievals"] == 2
+    assert metrics["total_concerts"] == 24
+    assert all(date == b"2026-10-17" for date, _ in hourly)
+
+def test_cli_reads_globbed_files(tmp_path, capsys):
+    """Test the CLI globs plain and gzipped files and prints both reports"""
+    write_logs(tmp_path, copies=2)
+    metrics = main(["--glob", str(tmp_path / "concert_booking_*"), "--workers", "1"])
+    assert metrics["confirmations"] == 4
+    output = capsys.readouterr().out
+    assert "Log Analysis Summary" in output
+    assert "2026-10-17 09h" in output
+    assert find_log_files([str(tmp_path / "*.gz")], datetime.date(2999, 1, 1)) == []
+
+def test_incremental_runs_read_only_appended_lines(tmp_path):
+    """Test checkpoints roll the counters forward and leave a half-written line for later"""
+    log = tmp_path / "concert_booking_17_10_2026.log"
+    state = str(tmp_path / "state.json")
+    log.write_text("\n".join(LINES[1:4]) + "\n")
+    metrics, _ = analyze_incremental([str(log)], state)
+    assert (metrics["requests"], metrics["retrievals"], metrics["confirmations"]) == (1, 1, 1)
+
+    with open(log, "a") as f:
+        f.write(LINES[3] + "\n" + LINES[2][:30])
+    metrics, hourly = analyze_incremental([str(log)], state)
+    assert metrics["confirmations"] == 2
+    assert metrics["retrievals"] == 1
+    assert hourly[(b"2026-10-17", b"09")]["confirmations"] == 2
+    with open(state) as f:
+        assert json.load(f)[str(log)]["offset"] == os.path.getsize(log) - 30
+
+    # The rest of the half-written line arrives before the next run
+    with open(log, "a") as f:
+        f.write(LINES[2][30:] + "\n")
+    metrics, _ = analyze_incremental([str(log)], state)
+    assert metrics["retrievals"] == 2
+    assert metrics["total_concerts"] == 24
+
+def test_incremental_run_finishes_rotated_file(tmp_path):
+    """Test a rotation between runs reports the old file's tail once and starts the new file over"""
+    log = tmp_path / "concert_booking.log"
+    state = str(tmp_path / "state.json")
+    log.write_text(LINES[3] + "\n")
+    analyze_incremental([str(log)], state)
+
+    with open(log, "a") as f:
+        f.write(LINES[3] + "\n")
+    rotated = tmp_path / "concert_booking.log.2026-10-17"
+    os.rename(log, rotated)
+    log.write_text(LINES[4] + "\n")
+
+    metrics, _ = analyze_incremental([str(log)], state)
+    assert (metrics["confirmations"], metrics["errors"]) == (2, 1)
+    metrics, _ = analyze_incremental([str(log)], state)
+    assert (metrics["confirmations"], metrics["errors"]) == (0, 1)
+    rotated_metrics, _ = analyze_incremental([str(rotated)], state)
+    assert rotated_metrics["confirmations"] == 2
+
+def test_incremental_rotation_chain_keeps_every_checkpoint(tmp_path):
+    """Test .1 -> .2 and log -> .1 in one rotation move both checkpoints"""
+    log, first, second = (str(tmp_path / name) for name in ["app.log", "app.log.1", "app.log.2"])
+    state = str(tmp_path / "state.json")
+    with open(first, "w") as f:
+        f.write(LINES[3] + "\n")
+    with open(log, "w") as f:
+        f.write(LINES[4] + "\n")
+    analyze_incremental([log, first], state)
+
+    os.rename(first, second)
+    os.rename(log, first)
+    with open(log, "w") as f:
+        f.write(LINES[1] + "\n")
+    metrics, _ = analyze_incremental([log, first, second], state)
+    assert (metrics["confirmations"], metrics["errors"], metrics["requests"]) == (1, 1, 1)
+    with open(state) as f:
+        checkpoints = json.load(f)
+    assert checkpoints[second]["metrics"]["confirmations"] == 1
+    assert checkpoints[first]["metrics"]["errors"] == 1
+
+def test_incremental_run_after_midnight_finishes_yesterdays_log(tmp_path, monkeypatch):
+    """Test yesterday's late lines go to its checkpoint, not into today's report"""
+    monkeypatch.chdir(tmp_path)
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    old_log = f"concert_booking_{yesterday.strftime('%d_%m_%Y')}.log"
+    new_log = f"concert_booking_{datetime.date.today().strftime('%d_%m_%Y')}.log"
+    with open(old_log, "w") as f:
+        f.write(LINES[3] + "\n")
+    analyze_incremental([old_log], "state.json")  # Yesterday's last run
+
+    # Written just before midnight, after that run
+    with open(old_log, "a") as f:
+        f.write(LINES[3] + "\n")
+    with open(new_log, "w") as f:
+        f.write(LINES[4] + "\n")
+
+    metrics = main(["--incremental", "--state", "state.json"])
+    assert (metrics["confirmations"], metrics["errors"]) == (0, 1)
+    with open("state.json") as f:
+        checkpoint = json.load(f)[old_log]
+    assert checkpoint["offset"] == os.path.getsize(old_log)
+    assert checkpoint["metrics"]["confirmations"] == 2
+
+def test_incremental_state_drops_gone_and_stale_files(tmp_path):
+    """Test checkpoints of deleted files and files past the retention window are pruned"""
+    state = str(tmp_path / "state.json")
+    logs = [str(tmp_path / f"day{number}.log") for number in range(3)]
+    for log in logs:
+        with open(log, "w") as f:
+            f.write(LINES[3] + "\n")
+    analyze_incremental(logs, state)
+
+    os.remove(logs[0])
+    week_ago = datetime.datetime.now().timestamp() - 8 * 24 * 3600
+    os.utime(logs[1], (week_ago, week_ago))
+    analyze_incremental([logs[2]], state, catch_up=True)
+    with open(state) as f:
+        assert list(json.load(f)) == [logs[2]]
@@ -0,0 +1,17 @@
+import os
+
+import calculate_metrics
+from show_metrics import analyze_jmeter_results, format_results_report
+
+RESULTS = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "out", "results.jtl"))
+
+def test_report_and_plot_from_breakdowns(tmp_path, monkeypatch):
+    """Test the plot is drawn from the interval breakdown and the report lists each sampler"""
+    monkeypatch.setattr(calculate_metrics, "code_coverage", lambda run: 0)
+    monkeypatch.chdir(tmp_path)
+    results = analyze_jmeter_results(RESULTS, coverage=False)
+
+    assert (tmp_path / "app/tests/out/plots/latency_distribution.png").exists()
+    report = format_results_report(results)
+    assert "Per Sampler:" in report
+    assert "Get Concerts" in report